@@ -0,0 +1,82 @@
+"""
+Shared setup for the benchmark scripts: configures Django and creates a throwaway
+test database (in-memory for SQLite), so benchmarks never touch real data.
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tracker.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+
+def setup_database():
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def timeit(fn, repeat=5):
+    # Best-of-N wall time in milliseconds
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+@contextmanager
+def quiet():
+    # The app prints debug lines from middleware / AI client; keep benchmark output readable
+    import contextlib
+    import io
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def seed_expenses(user_id="bench-user", rows=10_000, categories=12, tags=6):
+    import random
+    from datetime import date, timedelta
+    from decimal import Decimal
+
+    from expense.models import Category, Expense, Tag
+
+    random.seed(42)
+    cats = [Category.objects.create(user_id=user_id, name=f"Category {i}") for i in range(categories)]
+    tag_objs = [Tag.objects.create(user_id=user_id, name=f"tag{i}") for i in range(tags)]
+
+    start = date(2024, 1, 1)
+    expenses = Expense.objects.bulk_create(
+        [
+            Expense(
+                user_id=user_id,
+                amount=Decimal(random.randint(100, 500_000)) / 100,
+                description=f"Expense {i}",
+                date=start + timedelta(days=random.randrange(700)),
+                category=random.choice(cats + [None]),
+            )
+            for i in range(rows)
+        ],
+        batch_size=2000,
+    )
+
+    through = Expense.tag.through
+    through.objects.bulk_create(
+        [
+            through(expense_id=e.id, tag_id=random.choice(tag_objs).id)
+            for e in expenses
+            if random.random() < 0.3
+        ],
+        batch_size=2000,
+    )
+    return expenses
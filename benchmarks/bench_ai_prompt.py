@@ -0,0 +1,75 @@
+"""
+Insight prompt size and cost: full vs compact prompt mode, against a local fake model
+that reports usage_metadata like the Gemini SDK (1 token per 4 characters) and whose
+latency grows with prompt size. Usage is read back from the recorded AIUsage rows.
+
+    python benchmarks/bench_ai_prompt.py [categories]
+"""
+import sys
+import time
+from datetime import date
+from types import SimpleNamespace
+
+from _setup import quiet, seed_expenses, setup_database
+
+setup_database()
+
+from django.core.cache import cache  # noqa: E402
+from django.db.models import Sum  # noqa: E402
+
+from expense.ai import client as ai_client  # noqa: E402
+from expense.ai.usage import attribute_usage  # noqa: E402
+from expense.models import AIUsage  # noqa: E402
+from expense.services import get_date_range, get_insight_data  # noqa: E402
+
+# seed_expenses spreads rows over 2024-01-01 + 700 days; summarize a month in the middle
+REF_DATE = date(2025, 1, 15)
+FAKE_REPLY = '{"text": "Food was your top category at ₹12,400 (31% of spending), up ₹1,900 on last month."}'
+
+
+class FakeModels:
+    # Stand-in for client.models: fixed reply, prefill-like latency per prompt token
+    BASE_LATENCY = 0.02
+    PER_PROMPT_TOKEN = 0.00002
+
+    def generate_content(self, model, contents):
+        prompt_tokens = len(contents) // 4
+        time.sleep(self.BASE_LATENCY + prompt_tokens * self.PER_PROMPT_TOKEN)
+        return SimpleNamespace(
+            text=FAKE_REPLY,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=len(FAKE_REPLY) // 4,
+                thoughts_token_count=0,
+            ),
+        )
+
+
+def run(summary_data, prev_total, compact, calls):
+    AIUsage.objects.all().delete()
+    for _ in range(calls):
+        cache.clear()  # single-flight would otherwise answer repeats without a model call
+        with attribute_usage("bench-user", "insights"), quiet():
+            ai_client.generate_insights(summary_data, previous_total=prev_total, compact=compact)
+    totals = AIUsage.objects.aggregate(prompt=Sum("prompt_tokens"), cost=Sum("cost_usd"), latency=Sum("latency_ms"))
+    return totals["prompt"] / calls, totals["cost"], totals["latency"] / calls
+
+
+def main(categories=40, calls=20):
+    with quiet():
+        seed_expenses(rows=20_000, categories=categories)
+    start, end, prev_start, prev_end = get_date_range("bench-user", "monthly", REF_DATE)
+    summary_data, prev_total = get_insight_data("bench-user", "monthly", start, end, prev_start, prev_end)
+
+    ai_client.client = SimpleNamespace(models=FakeModels())
+    full = run(summary_data, prev_total, compact=False, calls=calls)
+    compact = run(summary_data, prev_total, compact=True, calls=calls)
+
+    print(f"Insight prompt, {len(summary_data['by_category'])} categories, {calls} calls per mode")
+    for name, (tokens, cost, latency) in (("full", full), ("compact", compact)):
+        print(f"  {name:8} {tokens:7.0f} prompt tokens/call   ${cost:.5f} total   {latency:6.1f} ms/call")
+    print(f"  compact saves {1 - compact[0] / full[0]:.0%} of prompt tokens, {1 - compact[1] / full[1]:.0%} of cost")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 40)
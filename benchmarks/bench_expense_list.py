@@ -0,0 +1,47 @@
+"""
+Expense list serialization: DRF ModelSerializer vs the .values() fast path.
+
+    python benchmarks/bench_expense_list.py [rows]
+"""
+import json
+import sys
+
+from _setup import quiet, seed_expenses, setup_database, timeit
+
+setup_database()
+
+from expense.models import Expense  # noqa: E402
+from expense.serializers import ExpenseSerializer, serialize_expense_values  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+
+def main(rows=10_000):
+    with quiet():
+        seed_expenses(rows=rows)
+
+    queryset = Expense.objects.filter(user_id="bench-user").order_by("-date", "-created_at")
+    render = JSONRenderer().render
+
+    def model_serializer(fields=None):
+        return ExpenseSerializer(queryset.all(), many=True, fields=fields).data
+
+    def fast_path(fields=None):
+        return serialize_expense_values(queryset.all(), fields)
+
+    # The fast path must be byte-identical for the default field set
+    assert render(model_serializer()) == render(fast_path()), "fast path output differs"
+
+    table_fields = ["id", "amount", "date", "category_name"]
+    assert render(model_serializer(table_fields)) == render(fast_path(table_fields))
+
+    print(f"Expense list, {rows} rows (best of 5)")
+    for label, fields in (("all fields", None), ("?fields=" + ",".join(table_fields), table_fields)):
+        slow = timeit(lambda: model_serializer(fields))
+        fast = timeit(lambda: fast_path(fields))
+        print(f"  {label:45} ModelSerializer {slow:8.1f} ms   fast path {fast:8.1f} ms   {slow / fast:5.1f}x")
+
+    print(json.dumps(fast_path(table_fields)[0]))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,58 @@
+"""
+Expense list response encoding: DRF JSONRenderer vs FastJSONRenderer, and the
+size/time of gzip vs brotli on the rendered body.
+
+    python benchmarks/bench_response_encoding.py [rows]
+"""
+import sys
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from _setup import quiet, seed_expenses, setup_database, timeit
+
+setup_database()
+
+from django.test import RequestFactory  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from expense.models import Expense  # noqa: E402
+from expense.serializers import serialize_expense_values  # noqa: E402
+from tracker.middleware import CompressionMiddleware  # noqa: E402
+from tracker.renderers import FastJSONRenderer  # noqa: E402
+
+
+def main(rows=10_000):
+    with quiet():
+        seed_expenses(rows=rows)
+
+    data = serialize_expense_values(Expense.objects.filter(user_id="bench-user").order_by("-date"))
+    drf, fast = JSONRenderer(), FastJSONRenderer()
+
+    # Raw Decimals / datetimes (as in summary payloads) must encode exactly like DRF
+    mixed = {"total": Decimal("12.50"), "at": datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc), 1: " "}
+    assert drf.render(mixed) == fast.render(mixed)
+    assert drf.render(data) == fast.render(data), "renderer output differs"
+
+    body = fast.render(data)
+    print(f"Expense list, {rows} rows, {len(body) / 1024:.0f} KiB JSON (best of 5)")
+
+    slow_ms = timeit(lambda: drf.render(data))
+    fast_ms = timeit(lambda: fast.render(data))
+    print(f"  render   JSONRenderer {slow_ms:8.1f} ms   FastJSONRenderer {fast_ms:8.1f} ms   {slow_ms / fast_ms:5.1f}x")
+
+    factory = RequestFactory()
+    middleware = CompressionMiddleware(lambda request: HttpResponse(body, content_type="application/json"))
+    for encoding in ("gzip", "br"):
+        request = factory.get("/api/expenses/", HTTP_ACCEPT_ENCODING=encoding)
+        response = middleware(request)
+        ms = timeit(lambda: middleware(request))
+        print(
+            f"  {encoding:5}    {len(response.content) / 1024:8.0f} KiB "
+            f"({len(response.content) / len(body):.0%} of original) in {ms:6.1f} ms"
+            f"   Content-Encoding: {response.get('Content-Encoding')}"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
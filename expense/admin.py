@@ -1,8 +1,126 @@
 from django.contrib import admin
-from expense.models import Category,Tag,Expense,userSetting
+from django.contrib.admin.views.main import SEARCH_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from expense.models import Category,Tag,Expense,RecurringExpense,Budget,CategoryRule,Insight,AIUsage,userSetting
 
-# Register your models here.
-admin.site.register(Category)
-admin.site.register(Tag)
-admin.site.register(Expense)
-admin.site.register(userSetting)
\ No newline at end of file
+
+def estimated_row_count(model, using):
+    """Row count from the database's table statistics, or None where there are none (SQLite)."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == "mysql":
+        sql = "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+    elif connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    For an unfiltered changelist of a large table, shows the estimated row count
+    instead of running COUNT(*) over every row. Filtered lists are counted exactly.
+    """
+    ESTIMATE_ABOVE = 100_000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, "query", None)
+        if query is not None and not query.where:
+            estimate = estimated_row_count(self.object_list.model, self.object_list.db)
+            if estimate and estimate > self.ESTIMATE_ABOVE:
+                return estimate
+        return super().count
+
+
+class PerUserDateHierarchyChangeList(ChangeList):
+    """
+    Shows the date drill-down only once the list is narrowed to a user (user_id search or
+    filter): on the whole table its DISTINCT dates query is a full scan.
+    """
+
+    def __init__(self, request, model, list_display, list_display_links, list_filter, date_hierarchy, *args):
+        narrowed = request.GET.get(SEARCH_VAR, "").strip() or any(
+            name.startswith("user_id") for name in request.GET
+        )
+        if not narrowed:
+            date_hierarchy = None
+        super().__init__(request, model, list_display, list_display_links, list_filter, date_hierarchy, *args)
+
+
+class FastAdmin(admin.ModelAdmin):
+    # Shared settings for per-user tables that grow with usage: no second full COUNT(*),
+    # only exact user_id search (indexed), sorting on the primary key
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_fields = ("=user_id",)
+    search_help_text = "Exact user id"
+    ordering = ("-id",)
+    sortable_by = ("id",)
+
+
+@admin.register(Category)
+class CategoryAdmin(FastAdmin):
+    list_display = ("id", "name", "user_id")
+
+
+@admin.register(Tag)
+class TagAdmin(FastAdmin):
+    list_display = ("id", "name", "user_id")
+
+
+@admin.register(Expense)
+class ExpenseAdmin(FastAdmin):
+    list_display = ("id", "user_id", "date", "amount", "category", "is_anomaly")
+    list_select_related = ("category",)
+    # Drill-down by date, only after searching by user so it stays on the (user_id, date) index
+    date_hierarchy = "date"
+    sortable_by = ("id", "date")
+    raw_id_fields = ("category", "tag", "recurring")
+    readonly_fields = ("anomaly_score", "is_anomaly", "created_at", "updated_at")
+
+    def get_changelist(self, request, **kwargs):
+        return PerUserDateHierarchyChangeList
+
+
+@admin.register(RecurringExpense)
+class RecurringExpenseAdmin(FastAdmin):
+    list_display = ("id", "user_id", "description", "amount", "frequency", "next_date", "active")
+    list_select_related = ("category",)
+    raw_id_fields = ("category",)
+
+
+@admin.register(Budget)
+class BudgetAdmin(FastAdmin):
+    list_display = ("id", "user_id", "category", "amount")
+    list_select_related = ("category",)
+    raw_id_fields = ("category",)
+
+
+@admin.register(CategoryRule)
+class CategoryRuleAdmin(FastAdmin):
+    list_display = ("id", "user_id", "kind", "pattern", "category", "priority")
+    list_select_related = ("category",)
+    raw_id_fields = ("category",)
+
+
+@admin.register(Insight)
+class InsightAdmin(FastAdmin):
+    list_display = ("id", "user_id", "period", "start", "end", "updated_at")
+
+
+@admin.register(AIUsage)
+class AIUsageAdmin(FastAdmin):
+    list_display = ("id", "user_id", "endpoint", "model", "prompt_tokens", "response_tokens", "latency_ms", "cost_usd", "created_at")
+    sortable_by = ("id", "created_at")
+
+
+@admin.register(userSetting)
+class UserSettingAdmin(FastAdmin):
+    list_display = ("id", "user_id", "theme")
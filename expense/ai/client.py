@@ -1,10 +1,15 @@
 import json
 import re
 import os
+import hashlib
+import threading
+import time
 from google import genai
 from google.genai import types # Added for configuration types
 from django.conf import settings
+from django.core.cache import cache
 from .prompts import CATEGORY_PROMPT, INSIGHT_PROMPT
+from .usage import record_usage
 
 # Configure API key if available
 api_key = os.getenv("GEMINI_API_KEY")
@@ -22,6 +27,99 @@ else:
     client = None
 
 
+# ---- Single-flight ----
+# Identical prompts issued at the same time (parallel dashboard calls, two tabs) share
+# one Gemini call: threads in this worker wait on an in-process Event, other workers
+# wait on a cache lock and pick the result up from the cache.
+SINGLE_FLIGHT_TIMEOUT = 30     # seconds a follower waits before calling Gemini itself
+SINGLE_FLIGHT_RESULT_TTL = 10  # seconds a finished result stays shareable
+SINGLE_FLIGHT_POLL = 0.1
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class _InflightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _fingerprint(model_name: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model_name}\n{prompt}".encode()).hexdigest()
+
+
+def _shared_across_workers(key: str, fn):
+    lock_key = f"ai-inflight:{key}"
+    result_key = f"ai-result:{key}"
+
+    result = cache.get(result_key)
+    if result is not None:
+        return result
+
+    deadline = time.monotonic() + SINGLE_FLIGHT_TIMEOUT
+    while True:
+        if cache.add(lock_key, 1, SINGLE_FLIGHT_TIMEOUT):
+            try:
+                result = fn()
+                if result is not None:
+                    cache.set(result_key, result, SINGLE_FLIGHT_RESULT_TTL)
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        # Another worker is already calling Gemini with this prompt
+        time.sleep(SINGLE_FLIGHT_POLL)
+        result = cache.get(result_key)
+        if result is not None:
+            return result
+        if time.monotonic() > deadline:
+            return fn()
+
+
+def _single_flight(key: str, fn):
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _InflightCall()
+            _inflight[key] = call
+
+    if not leader:
+        if call.done.wait(SINGLE_FLIGHT_TIMEOUT):
+            if call.error:
+                raise call.error
+            return call.result
+        return fn()
+
+    try:
+        call.result = _shared_across_workers(key, fn)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call.done.set()
+
+
+def _generate_text(model_name: str, prompt: str):
+    # Raw model text for `prompt`, deduplicated against identical in-flight requests
+    def call():
+        started = time.perf_counter()
+        # NEW SYNTAX: Call via client.models.generate_content
+        response = client.models.generate_content(
+            model=model_name,
+            contents=prompt
+        )
+        record_usage(model_name, response.usage_metadata, (time.perf_counter() - started) * 1000)
+        return response.text
+
+    return _single_flight(_fingerprint(model_name, prompt), call)
+
+
 def _safe_load_json(text: str):
     # Try to safely parse JSON from `text`
     try:
@@ -61,13 +159,7 @@ def suggest_category(description: str, amount: float, model_name: str = "gemini-
     )
 
     try:
-        # NEW SYNTAX: Call via client.models.generate_content
-        response = client.models.generate_content(
-            model=model_name, 
-            contents=prompt
-        )
-
-        raw_text = response.text
+        raw_text = _generate_text(model_name, prompt)
         text = re.sub(r'```json\s*|```', '', raw_text).strip()
         
         print("=== Gemini raw response ===")
@@ -87,38 +179,82 @@ def suggest_category(description: str, amount: float, model_name: str = "gemini-
         print("Google AI error in suggest_category():", repr(e))
         return None
 
-def generate_insights(summary: dict, previous_total: float | None = None, model_name: str = "gemini-2.5-flash"):
-    if not isinstance(summary, dict):
-        print("generate_insights: invalid 'summary' input (not a dict).")
-        return None
+def _compact_categories(by_category, top_n):
+    # Top-N categories by spend plus one "Others" bucket, whole-rupee amounts, no ids
+    ranked = sorted(by_category, key=lambda row: float(row.get("total") or 0), reverse=True)
+    compact = [{"name": row.get("name"), "total": round(float(row.get("total") or 0))} for row in ranked[:top_n]]
+    rest = ranked[top_n:]
+    if rest:
+        compact.append({
+            "name": f"Others ({len(rest)} categories)",
+            "total": round(sum(float(row.get("total") or 0) for row in rest)),
+        })
+    return compact
 
-    if not client:
-        print("AI: Client not configured, skipping insights generation.")
-        return None
+
+def _compact_anomalies(anomalies):
+    return [
+        {"description": row.get("description"), "category": row.get("category"), "amount": round(float(row.get("amount") or 0))}
+        for row in anomalies
+    ]
+
+
+def build_insight_prompt(summary: dict, previous_total: float | None = None, compact: bool | None = None):
+    """
+    Fills INSIGHT_PROMPT from a summary. Compact mode (settings.AI_COMPACT_PROMPTS by default)
+    sends only the top AI_COMPACT_TOP_CATEGORIES categories plus an "Others" bucket,
+    with amounts rounded to whole rupees.
+    """
+    if compact is None:
+        compact = getattr(settings, "AI_COMPACT_PROMPTS", False)
 
     by_cat = summary.get("by_category", [])
+    anomalies = summary.get("anomalies", [])
+    total = summary.get("total", 0)
+    if compact:
+        by_cat = _compact_categories(by_cat, getattr(settings, "AI_COMPACT_TOP_CATEGORIES", 5))
+        anomalies = _compact_anomalies(anomalies)
+        total = round(float(total or 0))
+        if previous_total is not None:
+            previous_total = round(float(previous_total))
+    separators = (",", ":") if compact else None
+
+    # Summary totals are Decimals
     try:
-        by_cat_json = json.dumps(by_cat)
+        by_cat_json = json.dumps(by_cat, default=float, separators=separators)
     except Exception:
         by_cat_json = "[]"
 
-    prompt = INSIGHT_PROMPT.format(
+    try:
+        anomalies_json = json.dumps(anomalies, default=str, separators=separators)
+    except Exception:
+        anomalies_json = "[]"
+
+    return INSIGHT_PROMPT.format(
         period=str(summary.get("period", "monthly")),
         start=str(summary.get("start", "")),
         end=str(summary.get("end", "")),
-        total=summary.get("total", 0),
+        total=total,
         by_category_json=by_cat_json,
+        anomalies_json=anomalies_json,
         previous_total=(previous_total if previous_total is not None else "null"),
     )
 
-    try:
-        # NEW SYNTAX: Call via client.models.generate_content
-        response = client.models.generate_content(
-            model=model_name, 
-            contents=prompt
-        )
 
-        text = response.text
+def generate_insights(summary: dict, previous_total: float | None = None, model_name: str = "gemini-2.5-flash",
+                      compact: bool | None = None):
+    if not isinstance(summary, dict):
+        print("generate_insights: invalid 'summary' input (not a dict).")
+        return None
+
+    if not client:
+        print("AI: Client not configured, skipping insights generation.")
+        return None
+
+    prompt = build_insight_prompt(summary, previous_total, compact)
+
+    try:
+        text = _generate_text(model_name, prompt)
         if text:
             text = text.strip()
 
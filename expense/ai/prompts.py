@@ -31,6 +31,8 @@ Generate a 3 to 5 sentence insight that includes:
    - say whether spending increased or decreased
    - mention the difference amount in ₹
 3. ONE realistic saving suggestion (not generic advice).
+4. If "anomalies" is not empty, briefly point out the most unusual expense
+   (it is much larger than what the user normally spends in that category).
 
 STYLE:
 - Use a calm, helpful tone (not preachy).
@@ -45,6 +47,7 @@ INPUT DATA:
   "end": "{end}",
   "total": {total},
   "by_category": {by_category_json},
+  "anomalies": {anomalies_json},
   "previous_total": {previous_total}
 }}
 
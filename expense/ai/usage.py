@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.conf import settings
+
+# Per-call token / cost accounting. Callers say who a call is for with
+# `attribute_usage(user_id, endpoint)`; the client records every real Gemini call
+# (calls answered by the single-flight are free) as an AIUsage row.
+DEFAULT_PRICING = {
+    # USD per million tokens; thinking tokens are billed as output
+    "gemini-2.5-flash": {"input": "0.30", "output": "2.50"},
+}
+
+_attribution = ContextVar("ai_usage_attribution", default=(None, None))
+
+
+@contextmanager
+def attribute_usage(user_id, endpoint):
+    token = _attribution.set((user_id, endpoint))
+    try:
+        yield
+    finally:
+        _attribution.reset(token)
+
+
+def estimate_cost(model_name, prompt_tokens, output_tokens):
+    prices = getattr(settings, "AI_PRICING", DEFAULT_PRICING).get(model_name)
+    if not prices:
+        return None
+    per_token = Decimal(1) / Decimal(1_000_000)
+    return (
+        prompt_tokens * Decimal(prices["input"]) + output_tokens * Decimal(prices["output"])
+    ) * per_token
+
+
+def record_usage(model_name, usage_metadata, latency_ms):
+    """Stores one AIUsage row from the SDK's usage_metadata. Never raises."""
+    from expense.models import AIUsage
+
+    user_id, endpoint = _attribution.get()
+
+    def count(name):
+        return getattr(usage_metadata, name, None) or 0
+
+    prompt_tokens = count("prompt_token_count")
+    response_tokens = count("candidates_token_count")
+    thinking_tokens = count("thoughts_token_count")
+    try:
+        AIUsage.objects.create(
+            user_id=user_id or "",
+            endpoint=endpoint or "unknown",
+            model=model_name,
+            prompt_tokens=prompt_tokens,
+            response_tokens=response_tokens,
+            thinking_tokens=thinking_tokens,
+            latency_ms=round(latency_ms),
+            cost_usd=estimate_cost(model_name, prompt_tokens, response_tokens + thinking_tokens),
+        )
+    except Exception as e:
+        print(f"AI usage: could not record call: {e}")
@@ -0,0 +1,245 @@
+from datetime import date, timedelta
+
+import numpy as np
+from django.db import transaction
+
+from .models import Category, Expense, CategoryAmountStats
+
+# Modified z-score (Iglewicz & Hoaglin): 0.6745 * (amount - median) / MAD
+WINDOW = 90          # most recent amounts per category that make up the statistics
+LOOKBACK_DAYS = 365  # ignore amounts older than this when building statistics
+RECENT_DAYS = 30     # expenses re-scored by the batch job
+MIN_SAMPLES = 8
+THRESHOLD = 3.5
+MIN_SPREAD = 0.05    # share of the median used as the scale when every amount is identical
+
+
+def _load_amounts(category_ids=None, user_ids=None, today=None):
+    # Compact (category_id, amount) arrays, newest first within each category
+    since = (today or date.today()) - timedelta(days=LOOKBACK_DAYS)
+    qs = Expense.objects.filter(category__isnull=False, date__gte=since)
+    if category_ids is not None:
+        qs = qs.filter(category_id__in=category_ids)
+    if user_ids is not None:
+        qs = qs.filter(user_id__in=user_ids)
+
+    rows = list(qs.order_by("category_id", "-date", "-id").values_list("category_id", "amount"))
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    cats, amounts = zip(*rows)
+    return np.array(cats, dtype=np.int64), np.array(amounts, dtype=np.float64)
+
+
+def compute_stats(cats, amounts):
+    """
+    Median / MAD over the first WINDOW amounts of every category, for all categories at once.
+    `cats` must be sorted. Returns (category_ids, median, mad, count) arrays.
+    """
+    if not cats.size:
+        empty = np.empty(0)
+        return cats, empty, empty, np.empty(0, dtype=np.int64)
+
+    starts = np.flatnonzero(np.r_[True, cats[1:] != cats[:-1]])
+    sizes = np.diff(np.r_[starts, cats.size])
+    group = np.repeat(np.arange(starts.size), sizes)
+    rank = np.arange(cats.size) - starts[group]
+    keep = rank < WINDOW
+
+    # One padded row per category so the medians are computed in a single call
+    matrix = np.full((starts.size, WINDOW), np.nan)
+    matrix[group[keep], rank[keep]] = amounts[keep]
+
+    median = np.nanmedian(matrix, axis=1)
+    deviation = np.abs(matrix - median[:, None])
+    mad = np.nanmedian(deviation, axis=1)
+
+    # When most amounts are identical MAD is 0; use the mean absolute deviation instead,
+    # rescaled so that the same 0.6745 / mad formula applies.
+    mean_ad = np.nanmean(deviation, axis=1)
+    mad = np.where(mad > 0, mad, mean_ad * 1.253314 * 0.6745)
+
+    return cats[starts], median, mad, np.minimum(sizes, WINDOW)
+
+
+def score(amounts, median, mad, count):
+    """Vectorized robust z-scores; NaN where the category has too little history."""
+    amounts = np.asarray(amounts, dtype=np.float64)
+    median = np.asarray(median, dtype=np.float64)
+    mad = np.asarray(mad, dtype=np.float64)
+    # Every amount identical (a fixed subscription): MAD is 0 even after the mean-deviation
+    # fallback, so repeats score 0 and other amounts are measured against MIN_SPREAD
+    scale = np.where(mad > 0, mad, np.maximum(np.abs(median) * MIN_SPREAD, 0.01))
+    z = 0.6745 * (amounts - median) / scale
+    return np.where(np.asarray(count) >= MIN_SAMPLES, z, np.nan)
+
+
+def refresh_stats(category_ids=None, user_ids=None, today=None):
+    """
+    Rebuilds CategoryAmountStats for the given categories / users (everything when both are None).
+    Returns the number of categories written.
+    """
+    cats, median, mad, count = compute_stats(*_load_amounts(category_ids, user_ids, today))
+    owners = dict(Category.objects.filter(id__in=cats.tolist()).values_list("id", "user_id"))
+
+    existing = CategoryAmountStats.objects.all()
+    if category_ids is not None:
+        existing = existing.filter(category_id__in=category_ids)
+    if user_ids is not None:
+        existing = existing.filter(user_id__in=user_ids)
+
+    with transaction.atomic():
+        existing.delete()
+        CategoryAmountStats.objects.bulk_create(
+            [
+                CategoryAmountStats(
+                    category_id=c, user_id=owners[c], median=m, mad=d, count=n
+                )
+                for c, m, d, n in zip(cats.tolist(), median.tolist(), mad.tolist(), count.tolist())
+                if c in owners
+            ],
+            batch_size=1000,
+        )
+    return cats.size
+
+
+def mark_stale(owners):
+    """
+    Flags the statistics of the given categories ({category_id: user_id}) for the next
+    refresh_stale_stats(), adding empty rows for categories that have none yet.
+    """
+    owners = {c: u for c, u in owners.items() if c}
+    if not owners:
+        return
+    if CategoryAmountStats.objects.filter(category_id__in=owners).update(stale=True) == len(owners):
+        return
+    existing = set(
+        CategoryAmountStats.objects.filter(category_id__in=owners).values_list("category_id", flat=True)
+    )
+    CategoryAmountStats.objects.bulk_create(
+        [
+            CategoryAmountStats(category_id=c, user_id=u, median=0, mad=0, count=0, stale=True)
+            for c, u in owners.items()
+            if c not in existing
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def refresh_stale_stats(today=None, batch_size=500):
+    """
+    Rebuilds the statistics flagged by mark_stale() and re-scores the recent expenses
+    of those categories, `batch_size` categories at a time.
+    Returns (categories_refreshed, expenses_scored, expenses_flagged).
+    """
+    category_ids = list(
+        CategoryAmountStats.objects.filter(stale=True).order_by("category_id").values_list("category_id", flat=True)
+    )
+    refreshed = scored = flagged = 0
+    for i in range(0, len(category_ids), batch_size):
+        batch = category_ids[i:i + batch_size]
+        refreshed += refresh_stats(category_ids=batch, today=today)
+        batch_scored, batch_flagged = score_recent(category_ids=batch, today=today)
+        scored += batch_scored
+        flagged += batch_flagged
+    return refreshed, scored, flagged
+
+
+def score_expense(category_id, amount):
+    """
+    Returns (anomaly_score, is_anomaly, stale) for a single expense from the stored statistics.
+    `stale` is None when the category has no statistics row yet.
+    """
+    if not category_id:
+        return None, False, None
+    stats = (
+        CategoryAmountStats.objects.filter(category_id=category_id)
+        .values_list("median", "mad", "count", "stale")
+        .first()
+    )
+    if not stats:
+        return None, False, None
+    z = float(score(float(amount), *stats[:3]))
+    if np.isnan(z):
+        return None, False, stats[3]
+    z = round(z, 2)
+    return z, z > THRESHOLD, stats[3]
+
+
+def score_expenses(expenses):
+    """
+    Sets anomaly_score / is_anomaly on Expense objects about to be written with
+    bulk_create / bulk_update (which skip the per-row signal), with one statistics query.
+    """
+    stats = {
+        c: (m, d, n)
+        for c, m, d, n in CategoryAmountStats.objects.filter(
+            category_id__in={e.category_id for e in expenses if e.category_id}
+        ).values_list("category_id", "median", "mad", "count")
+    }
+    for expense in expenses:
+        expense.anomaly_score, expense.is_anomaly = None, False
+
+    known = [e for e in expenses if e.category_id in stats]
+    if not known:
+        return
+    median, mad, count = (np.array(col) for col in zip(*(stats[e.category_id] for e in known)))
+    z = np.round(score([float(e.amount) for e in known], median, mad, count), 2)
+    for expense, value in zip(known, z.tolist()):
+        if not np.isnan(value):
+            expense.anomaly_score, expense.is_anomaly = value, value > THRESHOLD
+
+
+def score_recent(user_ids=None, today=None, batch_size=500, category_ids=None):
+    """
+    Re-scores all categorized expenses from the last RECENT_DAYS in one vectorized pass.
+    Returns (expenses_scored, expenses_flagged).
+    """
+    since = (today or date.today()) - timedelta(days=RECENT_DAYS)
+    qs = Expense.objects.filter(category__isnull=False, date__gte=since)
+    if user_ids is not None:
+        qs = qs.filter(user_id__in=user_ids)
+    if category_ids is not None:
+        qs = qs.filter(category_id__in=category_ids)
+
+    rows = list(qs.values_list("id", "category_id", "amount", "anomaly_score", "is_anomaly"))
+    if not rows:
+        return 0, 0
+    ids, cats, amounts, old_scores, old_flags = zip(*rows)
+    cats = np.array(cats, dtype=np.int64)
+
+    stats = list(
+        CategoryAmountStats.objects.filter(category_id__in=set(cats.tolist()))
+        .order_by("category_id")
+        .values_list("category_id", "median", "mad", "count")
+    )
+    if not stats:
+        return 0, 0
+    stat_cats, median, mad, count = (np.array(col) for col in zip(*stats))
+
+    # Line every expense up with its category's statistics
+    pos = np.clip(np.searchsorted(stat_cats, cats), 0, stat_cats.size - 1)
+    found = stat_cats[pos] == cats
+    z = np.round(score(amounts, median[pos], mad[pos], np.where(found, count[pos], 0)), 2)
+    flagged = z > THRESHOLD
+
+    # Only write rows whose score or flag actually moved
+    old_z = np.array([np.nan if s is None else round(s, 2) for s in old_scores])
+    changed = (flagged != np.array(old_flags, dtype=bool)) | ~(
+        (z == old_z) | (np.isnan(z) & np.isnan(old_z))
+    )
+
+    from .services import touch_expenses_on_commit
+
+    updates = [
+        Expense(
+            id=ids[i],
+            anomaly_score=(None if np.isnan(z[i]) else float(z[i])),
+            is_anomaly=bool(flagged[i]),
+        )
+        for i in np.flatnonzero(changed).tolist()
+    ]
+    # bulk_update runs every batch in one transaction; updated_at is set once it committed
+    Expense.objects.bulk_update(updates, ["anomaly_score", "is_anomaly"], batch_size=batch_size)
+    for i in range(0, len(updates), batch_size):
+        touch_expenses_on_commit(Expense.objects.filter(id__in=[e.id for e in updates[i:i + batch_size]]))
+    return len(ids), int(flagged.sum())
@@ -0,0 +1,192 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Expense
+from .ai.client import suggest_category
+from .ai.usage import attribute_usage
+from .rules import match_category
+
+# Categorization chain shared by expense writes and the backfill command:
+#   1. the user's CategoryRules (rules.py)
+#   2. cache of description -> category name (filled by earlier AI answers)
+#   3. local history: the user's own most recent category for the same description
+#   4. Gemini
+CATEGORY_CACHE_TTL = 60 * 60 * 24 * 30
+
+
+def normalize(description):
+    return " ".join(description.lower().split())
+
+
+def _cache_key(description):
+    return "category-for:" + hashlib.sha256(normalize(description).encode()).hexdigest()
+
+
+def remember_category(description, name):
+    cache.set(_cache_key(description), name, CATEGORY_CACHE_TTL)
+
+
+def resolve_local(user_id, descriptions):
+    """
+    Runs the cache and history steps for many descriptions at once.
+    Returns {description: category_name} for the ones that could be resolved.
+    """
+    descriptions = {d for d in descriptions if d}
+    keys = {d: _cache_key(d) for d in descriptions}
+    cached = cache.get_many(list(keys.values()))
+    resolved = {d: cached[k] for d, k in keys.items() if k in cached}
+
+    missing = descriptions - set(resolved)
+    if missing:
+        history = (
+            Expense.objects.filter(user_id=user_id, description__in=missing, category__isnull=False)
+            .order_by("date", "id")
+            .values_list("description", "category__name")
+        )
+        # Later rows overwrite earlier ones, so the most recent category wins
+        resolved.update(dict(history))
+
+    return resolved
+
+
+def suggest_with_ai(description, amount, model_name="gemini-2.5-flash"):
+    """Last step of the chain; successful answers are cached for everyone."""
+    suggestion = suggest_category(description=description, amount=float(amount), model_name=model_name)
+    if suggestion and isinstance(suggestion, dict):
+        name = suggestion.get("category")
+        if name:
+            remember_category(description, name)
+            return name
+    return None
+
+
+def _try_suggest(description, amount):
+    """Returns (name, ok); ok is False when the AI call itself failed, so the row can be retried."""
+    try:
+        # Backfill answers are shared by every user with this description
+        with attribute_usage(None, "categorize-backfill"):
+            return suggest_with_ai(description, amount), True
+    except Exception as e:
+        print(f"AI categorization failed for {description!r}: {e}")
+        return None, False
+    finally:
+        # Runs on the backfill's pool threads, which write usage rows
+        connection.close()
+
+
+def backfill_uncategorized(start_after=0, chunk_size=500, workers=4, use_ai=True, on_chunk=None):
+    """
+    Categorizes expenses that have a description but no category, in id order after
+    `start_after`. Each chunk is grouped by user and description so every distinct
+    description goes through the chain once; AI calls for a chunk run on `workers` threads.
+    Results are written with bulk_update. `on_chunk(resume_after, stats)` is called after
+    every committed chunk (for progress and checkpoints); `resume_after` stays below the
+    first row whose AI call failed, so a rerun from the checkpoint retries it.
+    Returns the stats dict.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from django.db import transaction
+    from django.utils import timezone
+
+    from . import anomalies, lookups
+    from .services import record_bulk_spend, touch_expenses_on_commit
+
+    pending = (
+        Expense.objects.filter(category__isnull=True, description__isnull=False)
+        .exclude(description="")
+        .order_by("id")
+    )
+    stats = {"scanned": 0, "updated": 0, "local": 0, "ai": 0, "failed": 0}
+    last_id = start_after
+    resume_after = None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            rows = list(
+                pending.filter(id__gt=last_id)
+                .values_list("id", "user_id", "description", "amount", "date")[:chunk_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            by_user = {}
+            for row in rows:
+                by_user.setdefault(row[1], []).append(row)
+
+            # Steps 1-3 per user, then one AI call per distinct description left over.
+            # Rules can depend on the amount, so they are keyed by expense id.
+            names = {}
+            matched = {}
+            ai_jobs = {}
+            for user_id, user_rows in by_user.items():
+                for expense_id, _, description, amount, _ in user_rows:
+                    name = match_category(user_id, description, amount)
+                    if name:
+                        matched[expense_id] = name
+                local = resolve_local(user_id, [row[2] for row in user_rows if row[0] not in matched])
+                for expense_id, _, description, amount, _ in user_rows:
+                    if expense_id in matched:
+                        continue
+                    if description in local:
+                        names[(user_id, description)] = (local[description], "local")
+                    elif use_ai:
+                        ai_jobs.setdefault(description, amount)
+
+            descriptions = list(ai_jobs)
+            answers = dict(zip(descriptions, pool.map(lambda d: _try_suggest(d, ai_jobs[d]), descriptions)))
+
+            updates = []
+            sources = {}
+            category_ids = {}
+            for expense_id, user_id, description, amount, day in rows:
+                if expense_id in matched:
+                    name, source = matched[expense_id], "local"
+                elif (user_id, description) in names:
+                    name, source = names[(user_id, description)]
+                else:
+                    name, ok = answers.get(description, (None, True))
+                    source = "ai"
+                    if not ok:
+                        stats["failed"] += 1
+                        if resume_after is None:
+                            resume_after = expense_id - 1
+                if not name:
+                    continue
+                if (user_id, name) not in category_ids:
+                    category_ids[(user_id, name)] = lookups.get_category(user_id, name).id
+                updates.append(Expense(
+                    id=expense_id, user_id=user_id, category_id=category_ids[(user_id, name)], amount=amount, date=day
+                ))
+                sources[expense_id] = source
+
+            with transaction.atomic():
+                # Skip rows the user categorized while this chunk was being resolved
+                still_pending = set(
+                    Expense.objects.select_for_update()
+                    .filter(id__in=[e.id for e in updates], category__isnull=True)
+                    .values_list("id", flat=True)
+                )
+                updates = [e for e in updates if e.id in still_pending]
+                now = timezone.now()
+                for expense in updates:
+                    expense.updated_at = now
+                anomalies.score_expenses(updates)
+                Expense.objects.bulk_update(
+                    updates, ["category", "anomaly_score", "is_anomaly", "updated_at"], batch_size=chunk_size
+                )
+                record_bulk_spend(updates)
+                anomalies.mark_stale({e.category_id: e.user_id for e in updates})
+                touch_expenses_on_commit(Expense.objects.filter(id__in=[e.id for e in updates]))
+
+            stats["scanned"] += len(rows)
+            stats["updated"] += len(updates)
+            for expense in updates:
+                stats[sources[expense.id]] += 1
+            if on_chunk:
+                on_chunk(last_id if resume_after is None else resume_after, stats)
+
+    return stats
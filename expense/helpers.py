@@ -46,3 +46,25 @@ def get_custom_month_range(ref_date: date, start_day: int) -> tuple[date, date]:
         end = this_period_start - timedelta(days=1)
 
     return start, end
+
+
+def add_months(ref_date: date, months: int, day: int | None = None) -> date:
+    # Move `months` months forward, keeping `day` (default: ref_date.day) clamped to the month length.
+    if day is None:
+        day = ref_date.day
+
+    y, m = ref_date.year, ref_date.month
+    for _ in range(months):
+        y, m = _add_month(y, m)
+
+    return date(y, m, _clamp_day(y, m, day))
+
+
+def next_occurrence(current: date, frequency: str, interval: int = 1, anchor_day: int | None = None) -> date:
+    # Next due date of a daily / weekly / monthly rule after `current`.
+    # Monthly rules stay on `anchor_day` (e.g. the 31st) even after a clamped short month.
+    if frequency == "daily":
+        return current + timedelta(days=interval)
+    if frequency == "weekly":
+        return current + timedelta(weeks=interval)
+    return add_months(current, interval, anchor_day)
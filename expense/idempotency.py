@@ -0,0 +1,128 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+# Idempotency-Key support for write endpoints. The first request with a key claims
+# it with an IdempotencyKey row (unique per user), so a retry that lands on another
+# worker sees the claim; when it finishes, the row holds its response for
+# IDEMPOTENCY_TTL and retries get that response back. Finished responses are also
+# kept in the cache as a fast path. A retry that arrives while the first request is
+# still running waits for it, the same way the AI single-flight waits in ai/client.py.
+DEFAULT_TTL = 60 * 60 * 24
+RUNNING_TIMEOUT = 60  # a crashed worker can't hold a key for longer
+WAIT_TIMEOUT = 30
+POLL_INTERVAL = 0.2
+MAX_KEY_LENGTH = 255
+
+
+def _digest(request, key):
+    scope = f"{request.method}\n{request.path}\n{key}"
+    return hashlib.sha256(scope.encode()).hexdigest()
+
+
+def _cache_key(user_id, digest):
+    return "idempotency:" + hashlib.sha256(f"{user_id}\n{digest}".encode()).hexdigest()
+
+
+def _fingerprint(request):
+    data = request.data
+    if hasattr(data, "lists"):
+        data = dict(data.lists())
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _ttl():
+    return getattr(settings, "IDEMPOTENCY_TTL", DEFAULT_TTL)
+
+
+def _replay(entry):
+    response = Response(entry["data"], status=entry["status"], headers=entry["headers"])
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _conflict():
+    return Response(
+        {"detail": "Idempotency-Key was already used with a different request body."},
+        status=422,
+    )
+
+
+def replay_or_run(request, user_id, run):
+    """
+    Runs `run()` (a view method returning a DRF Response) at most once per
+    Idempotency-Key for this user, method and path. Requests without the header run normally.
+    """
+    key = request.headers.get("Idempotency-Key")
+    if not key or not user_id:
+        return run()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response({"detail": "Idempotency-Key is too long."}, status=400)
+
+    digest = _digest(request, key)
+    cache_key = _cache_key(user_id, digest)
+    fingerprint = _fingerprint(request)
+
+    entry = cache.get(cache_key)
+    if entry is not None:
+        return _conflict() if entry["fingerprint"] != fingerprint else _replay(entry)
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while True:
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(user_id=user_id, key=digest, fingerprint=fingerprint)
+            break
+        except IntegrityError:
+            pass
+
+        record = IdempotencyKey.objects.filter(user_id=user_id, key=digest).first()
+        if record is None:
+            # Released between the insert and the read; try to take it again
+            continue
+        age = timezone.now() - record.created_at
+        running = record.status_code is None
+        if age > timedelta(seconds=RUNNING_TIMEOUT if running else _ttl()):
+            # Expired, or left behind by a crashed worker
+            IdempotencyKey.objects.filter(id=record.id).delete()
+            continue
+        if record.fingerprint != fingerprint:
+            return _conflict()
+        if not running:
+            entry = {"fingerprint": fingerprint, "status": record.status_code, **record.response}
+            cache.set(cache_key, entry, _ttl())
+            return _replay(entry)
+        if time.monotonic() > deadline:
+            return Response({"detail": "A request with this Idempotency-Key is still in progress."}, status=409)
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        response = run()
+    except Exception:
+        # Failed requests (validation errors included) can be retried with the same key
+        record.delete()
+        raise
+
+    if response.status_code >= 500:
+        record.delete()
+        return response
+
+    stored = {"data": response.data, "headers": dict(response.items())}
+    IdempotencyKey.objects.filter(id=record.id).update(status_code=response.status_code, response=stored)
+    cache.set(cache_key, {"fingerprint": fingerprint, "status": response.status_code, **stored}, _ttl())
+    return response
+
+
+def prune_idempotency_keys(before):
+    """Deletes keys created before `before`. Returns the number removed."""
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=before).delete()
+    return deleted
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category, Tag, userSetting
+
+# In-process, per-user name -> id maps for categories and tags.
+# Each user's map is loaded with one query on first use and dropped when
+# one of that user's categories or tags is renamed or deleted (see signals.py).
+# A row deleted through another worker surfaces as an IntegrityError when the
+# stale id is saved; views._save_expense drops the maps and retries once.
+MAX_CACHED_USERS = 1024
+
+_lock = threading.Lock()
+_category_ids = OrderedDict()
+_tag_ids = OrderedDict()
+
+
+def _get_user_map(store, model, user_id):
+    with _lock:
+        names = store.get(user_id)
+        if names is not None:
+            store.move_to_end(user_id)
+            return names
+
+    names = dict(model.objects.filter(user_id=user_id).values_list("name", "id"))
+
+    with _lock:
+        store[user_id] = names
+        store.move_to_end(user_id)
+        while len(store) > MAX_CACHED_USERS:
+            store.popitem(last=False)
+    return names
+
+
+def _resolve_many(store, model, user_id, wanted):
+    names = _get_user_map(store, model, user_id)
+    hits = {name: names[name] for name in wanted if name in names}
+
+    for name in wanted:
+        if name not in hits:
+            obj, _ = model.objects.get_or_create(user_id=user_id, name=name)
+            hits[name] = names[name] = obj.id
+    return [hits[name] for name in wanted]
+
+
+def get_category(user_id, name):
+    """
+    Returns a Category for `name`, creating it if needed.
+    The returned instance only carries id/user_id/name.
+    """
+    name = name.strip()
+    category_id, = _resolve_many(_category_ids, Category, user_id, [name])
+    return Category(id=category_id, user_id=user_id, name=name)
+
+
+def get_tag_ids(user_id, names):
+    """Returns tag ids for `names`, creating any missing tags."""
+    wanted = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+    return _resolve_many(_tag_ids, Tag, user_id, wanted) if wanted else []
+
+
+def invalidate_categories(user_id):
+    with _lock:
+        _category_ids.pop(user_id, None)
+
+
+def invalidate_tags(user_id):
+    with _lock:
+        _tag_ids.pop(user_id, None)
+
+
+# Per-user settings, read on every period calculation. signals.py drops the entry
+# whenever the user's settings are written, which reaches every worker only through a
+# shared cache (REDIS_URL). With the per-process default cache the entry is kept for
+# a few seconds instead. rebuild_category_spend, which re-buckets the budget counters
+# after a start day change, reads the row itself (`fresh`).
+USER_SETTINGS_TTL = 60 * 60 * 24
+LOCAL_USER_SETTINGS_TTL = 5
+DEFAULT_USER_SETTINGS = {"month_start_date": 1, "theme": "dark"}
+
+
+def _settings_key(user_id):
+    return f"user-settings:{user_id}"
+
+
+def _settings_ttl():
+    backend = settings.CACHES["default"]["BACKEND"]
+    return LOCAL_USER_SETTINGS_TTL if backend.endswith("LocMemCache") else USER_SETTINGS_TTL
+
+
+def get_user_settings(user_id, fresh=False):
+    """
+    Returns the user's settings as a dict, with defaults for users who never saved any.
+    With `fresh` the row is read from the database (and re-cached) even on a cache hit.
+    """
+    key = _settings_key(user_id)
+    values = None if fresh else cache.get(key)
+    if values is None:
+        row = (
+            userSetting.objects.filter(user_id=user_id)
+            .values(*DEFAULT_USER_SETTINGS)
+            .first()
+        )
+        values = row or dict(DEFAULT_USER_SETTINGS)
+        cache.set(key, values, _settings_ttl())
+    return values
+
+
+def invalidate_user_settings(user_id):
+    cache.delete(_settings_key(user_id))
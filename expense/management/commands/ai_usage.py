@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from expense.services import get_ai_usage_summary
+
+
+class Command(BaseCommand):
+    help = "Prints AI token usage, latency and estimated cost per user and endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30, help="Only calls from the last N days (0 = all).")
+        parser.add_argument("--user", default=None, help="Only this user id.")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options["days"]) if options["days"] else None
+        rows = get_ai_usage_summary(user_id=options["user"], since=since)
+        if not rows:
+            self.stdout.write("No AI calls recorded.")
+            return
+
+        self.stdout.write(
+            f"{'user':<32} {'endpoint':<20} {'model':<18} {'calls':>6} {'prompt':>9} "
+            f"{'response':>9} {'thinking':>9} {'avg ms':>7} {'cost $':>10}"
+        )
+        for row in rows:
+            cost = f"{row['cost_usd']:.4f}" if row["cost_usd"] is not None else "-"
+            self.stdout.write(
+                f"{(row['user_id'] or '-'):<32.32} {row['endpoint']:<20} {row['model']:<18} {row['calls']:>6} "
+                f"{row['prompt_tokens']:>9} {row['response_tokens']:>9} {row['thinking_tokens']:>9} "
+                f"{row['avg_latency_ms']:>7.0f} {cost:>10}"
+            )
+
+        total = sum((row["cost_usd"] for row in rows if row["cost_usd"] is not None), 0)
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(row['calls'] for row in rows)} calls, estimated ${total:.4f}."
+        ))
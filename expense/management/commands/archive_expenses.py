@@ -0,0 +1,30 @@
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from expense.services import archive_expenses
+
+
+class Command(BaseCommand):
+    help = "Moves expenses older than the archive horizon into the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=None,
+            help="Archive expenses older than this many days (default: settings.ARCHIVE_AFTER_DAYS).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        days = options["days"] or settings.ARCHIVE_AFTER_DAYS
+        before = date.today() - timedelta(days=days)
+
+        started = time.monotonic()
+        moved = archive_expenses(before, batch_size=options["batch_size"])
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {moved} expenses dated before {before.isoformat()} in {elapsed:.2f}s."
+        ))
@@ -0,0 +1,54 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from expense.categorize import backfill_uncategorized
+
+
+class Command(BaseCommand):
+    help = (
+        "Categorizes expenses that have no category (cache, local rules, then Gemini). "
+        "Progress is checkpointed, so the command can be interrupted and rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent AI calls.")
+        parser.add_argument("--no-ai", action="store_true", help="Only use the cache and local rules.")
+        parser.add_argument("--checkpoint", default="backfill_categories.checkpoint.json")
+        parser.add_argument("--reset", action="store_true", help="Ignore the checkpoint and start over.")
+
+    def handle(self, *args, **options):
+        checkpoint = Path(options["checkpoint"])
+        start_after = 0
+        if checkpoint.exists() and not options["reset"]:
+            start_after = json.loads(checkpoint.read_text())["last_id"]
+            self.stdout.write(f"Resuming after expense id {start_after}.")
+
+        started = time.monotonic()
+
+        def on_chunk(last_id, stats):
+            # Stays before the first failed AI call, so a rerun retries those rows
+            checkpoint.write_text(json.dumps({"last_id": last_id, **stats}))
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"  checkpoint at id {last_id}: scanned {stats['scanned']}, updated {stats['updated']} "
+                f"({stats['local']} local, {stats['ai']} AI, {stats['failed']} failed), "
+                f"{stats['scanned'] / elapsed:.0f} rows/s"
+            )
+
+        stats = backfill_uncategorized(
+            start_after=start_after,
+            chunk_size=options["chunk_size"],
+            workers=max(options["workers"], 1),
+            use_ai=not options["no_ai"],
+            on_chunk=on_chunk,
+        )
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {stats['scanned']} uncategorized expenses, categorized {stats['updated']} "
+            f"({stats['failed']} AI calls failed) in {elapsed:.2f}s ({stats['scanned'] / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
@@ -0,0 +1,30 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expense.services import materialize_recurring
+
+
+class Command(BaseCommand):
+    help = "Creates expenses for all recurring templates that are due. Safe to rerun."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Materialize occurrences up to this day (YYYY-MM-DD). Defaults to today.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        until = None
+        if options["date"]:
+            try:
+                until = date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError("Invalid date format.")
+
+        started = time.monotonic()
+        templates, created = materialize_recurring(until, batch_size=options["batch_size"])
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {templates} recurring templates, created {created} expenses in {elapsed:.2f}s."
+        ))
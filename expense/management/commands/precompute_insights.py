@@ -0,0 +1,37 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expense.services import precompute_insights
+
+
+class Command(BaseCommand):
+    help = "Generates AI insights ahead of time for all recently active users."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--period", default="monthly", choices=["monthly", "weekly"])
+        parser.add_argument("--date", help="Reference day (YYYY-MM-DD). Defaults to today.")
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent AI calls.")
+        parser.add_argument("--active-days", type=int, default=35)
+
+    def handle(self, *args, **options):
+        ref_date = None
+        if options["date"]:
+            try:
+                ref_date = date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError("Invalid date format.")
+
+        started = time.monotonic()
+        checked, generated, failures = precompute_insights(
+            period=options["period"],
+            ref_date=ref_date,
+            active_days=options["active_days"],
+            workers=max(options["workers"], 1),
+        )
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} users: {generated} insights generated, {failures} failed in {elapsed:.2f}s."
+        ))
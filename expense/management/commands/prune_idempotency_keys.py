@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from expense.idempotency import prune_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = "Deletes Idempotency-Key records older than settings.IDEMPOTENCY_TTL."
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_TTL)
+        removed = prune_idempotency_keys(before)
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed} idempotency keys older than {before:%Y-%m-%d %H:%M}."
+        ))
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from expense.services import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Deletes sync tombstones older than settings.SYNC_TOMBSTONE_DAYS."
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+        removed = prune_tombstones(before)
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed} tombstones older than {before:%Y-%m-%d %H:%M}."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from expense.services import rebuild_category_spend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-category spend counters used by budgets from Expense rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", action="append", dest="users",
+            help="Only rebuild counters for this user id (can be repeated).",
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_category_spend(options["users"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} spend counters."))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from expense.anomalies import refresh_stats, refresh_stale_stats, score_recent, RECENT_DAYS
+
+
+class Command(BaseCommand):
+    help = "Rebuilds per-category amount statistics and re-flags unusual recent expenses."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", action="append", dest="users",
+            help="Only refresh this user id (can be repeated).",
+        )
+        parser.add_argument(
+            "--stale", action="store_true",
+            help="Only rebuild categories whose expenses changed since their last refresh "
+                 "(cheap enough to run every few minutes).",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options["stale"]:
+            categories, scored, flagged = refresh_stale_stats()
+        else:
+            categories = refresh_stats(user_ids=options["users"])
+            scored, flagged = score_recent(user_ids=options["users"])
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats for {categories} categories, scored {scored} expenses from the last "
+            f"{RECENT_DAYS} days ({flagged} flagged) in {elapsed:.2f}s."
+        ))
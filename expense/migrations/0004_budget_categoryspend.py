@@ -0,0 +1,40 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0003_remove_usersetting_month_start_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Budget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(db_index=True, max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='expense.category')),
+            ],
+            options={
+                'unique_together': {('user_id', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CategorySpend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(max_length=255)),
+                ('period_start', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='expense.category')),
+            ],
+            options={
+                'unique_together': {('user_id', 'period_start', 'category')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0005_recurringexpense'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryAmountStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='expense.category')),
+                ('user_id', models.CharField(db_index=True, max_length=255)),
+                ('median', models.FloatField()),
+                ('mad', models.FloatField()),
+                ('count', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='anomaly_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='is_anomaly',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0006_expense_anomaly'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Insight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(max_length=255)),
+                ('period', models.CharField(max_length=20)),
+                ('start', models.DateField(blank=True, null=True)),
+                ('end', models.DateField(blank=True, null=True)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('text', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('user_id', 'period', 'start', 'end')},
+            },
+        ),
+    ]
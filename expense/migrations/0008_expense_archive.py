@@ -0,0 +1,47 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0007_insight'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedExpense',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('user_id', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('date', models.DateField()),
+                ('anomaly_score', models.FloatField(blank=True, null=True)),
+                ('is_anomaly', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='expense.category')),
+                ('tag', models.ManyToManyField(blank=True, related_name='archived_expenses', to='expense.tag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id', 'date'], name='expense_arc_user_id_10a8b1_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExpenseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(max_length=255)),
+                ('date', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('count', models.PositiveIntegerField()),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='expense.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id', 'date'], name='expense_exp_user_id_6a180d_idx')],
+            },
+        ),
+    ]
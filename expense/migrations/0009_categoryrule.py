@@ -0,0 +1,31 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0008_expense_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(db_index=True, max_length=255)),
+                ('kind', models.CharField(choices=[('keyword', 'Description contains'), ('regex', 'Description matches regex'), ('amount', 'Amount in range')], default='keyword', max_length=10)),
+                ('pattern', models.CharField(blank=True, max_length=255)),
+                ('min_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('priority', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rules', to='expense.category')),
+            ],
+            options={
+                'ordering': ['priority', 'id'],
+            },
+        ),
+    ]
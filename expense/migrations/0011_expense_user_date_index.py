@@ -0,0 +1,17 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0010_sync_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['user_id', 'date'], name='expense_exp_user_id_31bf86_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0011_expense_user_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersetting',
+            name='month_start_date',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0012_usersetting_month_start_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(blank=True, max_length=255)),
+                ('endpoint', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=50)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('response_tokens', models.PositiveIntegerField(default=0)),
+                ('thinking_tokens', models.PositiveIntegerField(default=0)),
+                ('latency_ms', models.PositiveIntegerField(default=0)),
+                ('cost_usd', models.DecimalField(blank=True, decimal_places=6, max_digits=12, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id', 'created_at'], name='expense_aiu_user_id_053a61_idx')],
+            },
+        ),
+    ]
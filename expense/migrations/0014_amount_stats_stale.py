@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0013_aiusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoryamountstats',
+            name='stale',
+            field=models.BooleanField(default=False),
+        ),
+    ]
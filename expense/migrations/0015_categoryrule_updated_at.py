@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0014_amount_stats_stale'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoryrule',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
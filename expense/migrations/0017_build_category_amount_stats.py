@@ -0,0 +1,52 @@
+from datetime import date, timedelta
+
+import numpy as np
+from django.db import migrations
+
+
+def build_stats(apps, schema_editor):
+    """
+    Builds the first CategoryAmountStats rows so new expenses are scored right after
+    the deploy. Rows are left stale, so the first `refresh_anomalies --stale` run also
+    re-scores the existing recent expenses.
+    """
+    from expense.anomalies import LOOKBACK_DAYS, compute_stats
+
+    Expense = apps.get_model("expense", "Expense")
+    Category = apps.get_model("expense", "Category")
+    CategoryAmountStats = apps.get_model("expense", "CategoryAmountStats")
+
+    since = date.today() - timedelta(days=LOOKBACK_DAYS)
+    rows = list(
+        Expense.objects.filter(category__isnull=False, date__gte=since)
+        .order_by("category_id", "-date", "-id")
+        .values_list("category_id", "amount")
+    )
+    if not rows:
+        return
+    cats, amounts = zip(*rows)
+    cats, median, mad, count = compute_stats(
+        np.array(cats, dtype=np.int64), np.array(amounts, dtype=np.float64)
+    )
+    owners = dict(Category.objects.filter(id__in=cats.tolist()).values_list("id", "user_id"))
+
+    CategoryAmountStats.objects.all().delete()
+    CategoryAmountStats.objects.bulk_create(
+        [
+            CategoryAmountStats(category_id=c, user_id=owners[c], median=m, mad=d, count=n, stale=True)
+            for c, m, d, n in zip(cats.tolist(), median.tolist(), mad.tolist(), count.tolist())
+            if c in owners
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0016_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,11 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 # Create your models here.
 class Category(models.Model):
     user_id = models.CharField(max_length=255)
     name = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('user_id', 'name')
@@ -14,6 +16,7 @@ class Category(models.Model):
 class Tag(models.Model):
     user_id = models.CharField(max_length=255)
     name = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('user_id', 'name')
@@ -34,13 +37,267 @@ class Expense(models.Model):
         on_delete=models.SET_NULL
     )
     tag = models.ManyToManyField(Tag, blank=True)
+    # Set when the row was generated from a RecurringExpense template
+    recurring = models.ForeignKey(
+        'RecurringExpense',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='expenses'
+    )
+    # Robust z-score of the amount against the user's recent spending in this category
+    anomaly_score = models.FloatField(null=True, blank=True)
+    is_anomaly = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Drives /api/sync/; bulk_update / update() callers must set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recurring', 'date'], name='unique_recurring_occurrence'),
+        ]
+        indexes = [
+            models.Index(fields=['user_id', 'date']),
+            models.Index(fields=['user_id', 'updated_at']),
+        ]
 
     def __str__(self):
         return f"{self.description or 'Expense'} - {self.amount}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_spend()
+        return instance
+
+    def _remember_spend(self):
+        # Snapshot of the fields that drive budget counters, used to compute deltas on save
+        self._loaded_spend = (self.category_id, self.date, self.amount)
+
+class ArchivedExpense(models.Model):
+    # Expenses older than the archive horizon, moved out of Expense by `archive_expenses`.
+    # Keeps the original Expense id so clients see the same rows.
+    id = models.BigIntegerField(primary_key=True)
+    user_id = models.CharField(max_length=255)
+    amount = models.DecimalField(decimal_places=2, max_digits=10)
+    description = models.TextField(null=True, blank=True)
+    date = models.DateField()
+    category = models.ForeignKey(
+        Category,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
+    tag = models.ManyToManyField(Tag, blank=True, related_name='archived_expenses')
+    anomaly_score = models.FloatField(null=True, blank=True)
+    is_anomaly = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user_id', 'date'])]
+
+    def __str__(self):
+        return f"{self.description or 'Expense'} - {self.amount} (archived)"
+
+class ExpenseRollup(models.Model):
+    # Daily per-category totals of archived expenses, so summaries over any range stay exact
+    user_id = models.CharField(max_length=255)
+    category = models.ForeignKey(
+        Category,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL
+    )
+    date = models.DateField()
+    total = models.DecimalField(decimal_places=2, max_digits=14)
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['user_id', 'date'])]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date}: {self.total} ({self.count})"
+
+class Tombstone(models.Model):
+    # Left behind when an expense, category or tag is deleted, so /api/sync/ can
+    # tell clients to drop their copy. Pruned after SYNC_TOMBSTONE_DAYS.
+    MODEL_CHOICES = [
+        ("expense", "Expense"),
+        ("category", "Category"),
+        ("tag", "Tag"),
+    ]
+
+    user_id = models.CharField(max_length=255)
+    model = models.CharField(max_length=10, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user_id', 'deleted_at'])]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted ({self.user_id})"
+
+class RecurringExpense(models.Model):
+    FREQUENCY_CHOICES = [
+        ("daily", "Daily"),
+        ("weekly", "Weekly"),
+        ("monthly", "Monthly"),
+    ]
+
+    user_id = models.CharField(max_length=255, db_index=True)
+    amount = models.DecimalField(decimal_places=2, max_digits=10)
+    description = models.TextField(null=True, blank=True)
+    category = models.ForeignKey(
+        Category,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL
+    )
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default="monthly")
+    interval = models.PositiveSmallIntegerField(default=1)
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    # Next occurrence that has not been materialized yet
+    next_date = models.DateField(db_index=True)
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.description or 'Recurring'} - {self.amount} ({self.frequency})"
+
+    def save(self, *args, **kwargs):
+        if self.next_date is None:
+            self.next_date = self.start_date
+        super().save(*args, **kwargs)
+
+class Budget(models.Model):
+    # Monthly spending limit for one of the user's categories
+    user_id = models.CharField(max_length=255, db_index=True)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    amount = models.DecimalField(decimal_places=2, max_digits=10)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user_id', 'category')
+
+    def __str__(self):
+        return f"{self.category.name}: {self.amount} ({self.user_id})"
+
+class CategoryRule(models.Model):
+    # User-defined auto-categorization, applied before any AI call (see rules.py).
+    # The amount bounds are optional extra conditions on keyword/regex rules.
+    KIND_CHOICES = [
+        ("keyword", "Description contains"),
+        ("regex", "Description matches regex"),
+        ("amount", "Amount in range"),
+    ]
+
+    user_id = models.CharField(max_length=255, db_index=True)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="rules")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default="keyword")
+    pattern = models.CharField(max_length=255, blank=True)
+    min_amount = models.DecimalField(decimal_places=2, max_digits=10, null=True, blank=True)
+    max_amount = models.DecimalField(decimal_places=2, max_digits=10, null=True, blank=True)
+    # Lower runs first; ties go to the older rule
+    priority = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Part of the version rules.get_matcher checks its compiled matchers against
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["priority", "id"]
+
+    def __str__(self):
+        return f"{self.kind} {self.pattern!r} -> {self.category_id} ({self.user_id})"
+
+class CategorySpend(models.Model):
+    # Running total per user, category and month period, kept in sync on expense writes
+    user_id = models.CharField(max_length=255)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    period_start = models.DateField()
+    total = models.DecimalField(decimal_places=2, max_digits=12, default=0)
+
+    class Meta:
+        unique_together = ('user_id', 'period_start', 'category')
+
+    def __str__(self):
+        return f"{self.category_id} {self.period_start}: {self.total}"
+
+class CategoryAmountStats(models.Model):
+    # Median / MAD of recent amounts per category, used to score new expenses
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True)
+    user_id = models.CharField(max_length=255, db_index=True)
+    median = models.FloatField()
+    mad = models.FloatField()
+    count = models.PositiveIntegerField()
+    # Set when the category's expenses changed; refresh_stale_stats() rebuilds these rows
+    stale = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.category_id}: median {self.median}, mad {self.mad} (n={self.count})"
+
+class Insight(models.Model):
+    # AI insight text for a user's period, valid while the summary fingerprint matches
+    user_id = models.CharField(max_length=255)
+    period = models.CharField(max_length=20)
+    start = models.DateField(null=True, blank=True)
+    end = models.DateField(null=True, blank=True)
+    fingerprint = models.CharField(max_length=64)
+    text = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user_id', 'period', 'start', 'end')
+
+    def __str__(self):
+        return f"Insight {self.period} {self.start}..{self.end} ({self.user_id})"
+
+class AIUsage(models.Model):
+    # One Gemini call: tokens from the SDK's usage_metadata, latency and estimated cost
+    user_id = models.CharField(max_length=255, blank=True)
+    endpoint = models.CharField(max_length=50)
+    model = models.CharField(max_length=50)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    response_tokens = models.PositiveIntegerField(default=0)
+    thinking_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    cost_usd = models.DecimalField(decimal_places=6, max_digits=12, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user_id', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.model}: {self.prompt_tokens}+{self.response_tokens} tokens ({self.user_id})"
+
+class IdempotencyKey(models.Model):
+    # One write sent with an Idempotency-Key header (see idempotency.py). Rows without
+    # a status are still running; finished ones hold the response to replay.
+    user_id = models.CharField(max_length=255)
+    # sha256 of the method, path and the client's key
+    key = models.CharField(max_length=64)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [models.Index(fields=['created_at'])]
+
+    def __str__(self):
+        return f"{self.key[:12]} {self.status_code or 'running'} ({self.user_id})"
+
 class userSetting(models.Model):
     user_id = models.CharField(max_length=255, unique=True, db_index=True)
+    # Day of the month (1-28) on which the user's monthly period starts, e.g. payday
+    month_start_date = models.PositiveIntegerField(default=1)
     theme = models.CharField(max_length=20, default="dark")
 
     def __str__(self):
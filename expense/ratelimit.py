@@ -0,0 +1,83 @@
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Per-user limits for AI-backed operations. Each operation has a token bucket
+# (`capacity` calls, refilled at `refill_per_minute`) and a daily quota.
+DEFAULT_AI_RATE_LIMITS = {
+    "insights": {"capacity": 5, "refill_per_minute": 2, "daily_quota": 100},
+    "categorize": {"capacity": 30, "refill_per_minute": 10, "daily_quota": 1000},
+}
+
+LOCK_TIMEOUT = 2      # seconds; a crashed worker can't hold a bucket for longer
+LOCK_RETRIES = 20
+LOCK_WAIT = 0.005
+
+
+def _limits(operation):
+    return getattr(settings, "AI_RATE_LIMITS", DEFAULT_AI_RATE_LIMITS)[operation]
+
+
+def _acquire(lock_key):
+    # cache.add is atomic on every shared backend, so it doubles as a short mutex
+    for _ in range(LOCK_RETRIES):
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            return True
+        time.sleep(LOCK_WAIT)
+    return False
+
+
+def consume_token(user_id, operation, tokens=1):
+    """
+    Takes `tokens` from the user's bucket for `operation`.
+    Returns False when the bucket is empty (or can't be locked in time).
+    """
+    limits = _limits(operation)
+    capacity = limits["capacity"]
+    rate = limits["refill_per_minute"] / 60.0
+
+    key = f"ai-bucket:{operation}:{user_id}"
+    lock_key = f"{key}:lock"
+    if not _acquire(lock_key):
+        return False
+
+    try:
+        now = time.time()
+        state = cache.get(key)
+        if state is None:
+            available = capacity
+        else:
+            available, updated = state
+            available = min(capacity, available + (now - updated) * rate)
+
+        allowed = available >= tokens
+        if allowed:
+            available -= tokens
+
+        # Expire once the bucket would have refilled completely anyway
+        ttl = int((capacity - available) / rate) + 1 if rate else None
+        cache.set(key, (available, now), ttl)
+        return allowed
+    finally:
+        cache.delete(lock_key)
+
+
+def within_daily_quota(user_id, operation):
+    """Counts one call against today's quota; False once the quota is used up."""
+    key = f"ai-quota:{operation}:{user_id}:{date.today().isoformat()}"
+    cache.add(key, 0, 60 * 60 * 24)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Key expired between add and incr
+        cache.set(key, 1, 60 * 60 * 24)
+        count = 1
+    return count <= _limits(operation)["daily_quota"]
+
+
+def allow_ai_call(user_id, operation):
+    if not user_id:
+        return False
+    return consume_token(user_id, operation) and within_daily_quota(user_id, operation)
@@ -0,0 +1,235 @@
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+import regex
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+from django.db.models import Count, Max
+
+from .models import CategoryRule
+
+# Every user's CategoryRules are compiled into one RuleMatcher: an Aho-Corasick
+# automaton for all keywords, so they cost one pass over the description however many
+# there are, plus each regex compiled on its own.
+# Matchers live in an in-process LRU, checked on every use against a version read
+# from the database (one aggregate query), so edits made on any worker apply everywhere.
+MAX_CACHED_USERS = 1024
+
+# User regexes run inside requests: keep them short, free of nested quantifiers
+# (the usual catastrophic-backtracking shape), and only look at the start of long descriptions.
+# They run on the `regex` engine, whose searches can be cut off: all of a user's patterns
+# share MATCH_TIMEOUT seconds per expense, and rules that don't finish in time don't match.
+MAX_REGEX_LENGTH = 100
+MAX_MATCH_LENGTH = 500
+MATCH_TIMEOUT = 0.05
+
+_lock = threading.Lock()
+_matchers = OrderedDict()
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton; search() returns the values of every keyword found in the text."""
+
+    def __init__(self, keywords):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for word, value in keywords:
+            node = 0
+            for ch in word:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] += (value,)
+
+        # Breadth-first so every failure link points at an already finished node
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def search(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+_REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, sre_parse.POSSESSIVE_REPEAT)
+
+
+def _children(op, av):
+    # Nested subpatterns of one parsed regex item
+    if op in _REPEATS:
+        return [av[2]]
+    if op is sre_parse.SUBPATTERN:
+        return [av[3]]
+    if op is sre_parse.BRANCH:
+        return av[1]
+    if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        return [av[1]]
+    if op is sre_parse.ATOMIC_GROUP:
+        return [av]
+    if op is sre_parse.GROUPREF_EXISTS:
+        return [p for p in av[1:] if p is not None]
+    return []
+
+
+def _repeats(items):
+    return any(
+        (op in _REPEATS and av[1] > 1) or any(_repeats(child) for child in _children(op, av))
+        for op, av in items
+    )
+
+
+def _unsafe(items):
+    for op, av in items:
+        if op in _REPEATS and av[1] > 1 and _repeats(av[2]):
+            return "Nested quantifiers like (a+)+ are not supported."
+        for child in _children(op, av):
+            problem = _unsafe(child)
+            if problem:
+                return problem
+    return None
+
+
+def check_regex(pattern):
+    """Raises ValueError with a user-facing message if `pattern` can't be used in a regex rule."""
+    if len(pattern) > MAX_REGEX_LENGTH:
+        raise ValueError(f"Regex patterns are limited to {MAX_REGEX_LENGTH} characters.")
+    try:
+        parsed = sre_parse.parse(pattern, re.IGNORECASE)
+        regex.compile(pattern, regex.IGNORECASE)
+    except (re.error, regex.error) as e:
+        raise ValueError(f"Invalid regex: {e}")
+    problem = _unsafe(parsed)
+    if problem:
+        raise ValueError(problem)
+
+
+def _in_range(amount, low, high):
+    if low is None and high is None:
+        return True
+    if amount is None:
+        return False
+    return (low is None or amount >= low) and (high is None or amount <= high)
+
+
+class RuleMatcher:
+    """
+    Compiled form of one user's rules. `rules` are (kind, pattern, min_amount,
+    max_amount, category_name) tuples in priority order; the first matching rule wins.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        keywords = []
+        # Regex and amount-only rules, checked one by one in priority order
+        self.checked = []
+        for index, (kind, pattern, low, high, _) in enumerate(rules):
+            if kind == "keyword" and pattern.strip():
+                keywords.append((pattern.strip().lower(), index))
+            elif kind == "regex" and pattern:
+                try:
+                    check_regex(pattern)
+                except ValueError as e:
+                    # Saved before these checks existed
+                    print(f"Skipping regex rule {pattern!r}: {e}")
+                    continue
+                self.checked.append((index, regex.compile(pattern, regex.IGNORECASE)))
+            elif kind == "amount":
+                self.checked.append((index, None))
+
+        self.keywords = KeywordAutomaton(keywords) if keywords else None
+
+    def match(self, description, amount=None):
+        """Returns the category name of the first matching rule, or None."""
+        description = (description or "")[:MAX_MATCH_LENGTH]
+        best = len(self.rules)
+
+        if self.keywords and description:
+            for index in self.keywords.search(description.lower()):
+                if index < best and _in_range(amount, *self.rules[index][2:4]):
+                    best = index
+
+        deadline = time.monotonic() + MATCH_TIMEOUT
+        for index, compiled in self.checked:
+            if index >= best:
+                break
+            if not _in_range(amount, *self.rules[index][2:4]):
+                continue
+            if compiled is None:
+                best = index
+                break
+            try:
+                found = compiled.search(description, timeout=max(deadline - time.monotonic(), 0))
+            except TimeoutError:
+                print(f"Regex rule {self.rules[index][1]!r} timed out; skipping the remaining patterns")
+                break
+            if found:
+                best = index
+                break
+
+        return self.rules[best][4] if best < len(self.rules) else None
+
+
+def _version(user_id):
+    # Changes whenever one of the user's rules is added, edited or deleted, or a category
+    # a rule points at is renamed
+    return tuple(
+        CategoryRule.objects.filter(user_id=user_id)
+        .aggregate(count=Count("id"), changed=Max("updated_at"), renamed=Max("category__updated_at"))
+        .values()
+    )
+
+
+def get_matcher(user_id):
+    version = _version(user_id)
+    with _lock:
+        cached = _matchers.get(user_id)
+        if cached is not None and cached[0] == version:
+            _matchers.move_to_end(user_id)
+            return cached[1]
+
+    rules = list(
+        CategoryRule.objects.filter(user_id=user_id)
+        .order_by("priority", "id")
+        .values_list("kind", "pattern", "min_amount", "max_amount", "category__name")
+    )
+    matcher = RuleMatcher(rules)
+
+    with _lock:
+        _matchers[user_id] = (version, matcher)
+        _matchers.move_to_end(user_id)
+        while len(_matchers) > MAX_CACHED_USERS:
+            _matchers.popitem(last=False)
+    return matcher
+
+
+def match_category(user_id, description, amount=None):
+    """Category name from the user's rules for this expense, or None."""
+    return get_matcher(user_id).match(description, amount)
@@ -1,5 +1,10 @@
+from datetime import date
+
 from rest_framework import serializers
-from .models import Category, Tag, Expense,userSetting
+from rest_framework.relations import PKOnlyObject
+from .models import Category, Tag, Expense, ArchivedExpense, RecurringExpense, Budget, CategoryRule, userSetting
+from .rules import check_regex
+from .services import get_budget_status, get_period_start
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -18,6 +23,14 @@ class ExpenseSerializer(serializers.ModelSerializer):
         source="category.name", read_only=True
     )
 
+    def __init__(self, *args, **kwargs):
+        # Optional sparse fieldset, e.g. fields=["id", "amount", "date"]
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Expense
         fields = [
@@ -28,11 +41,210 @@ class ExpenseSerializer(serializers.ModelSerializer):
             'category',
             'category_name',
             'tag',
+            'anomaly_score',
+            'is_anomaly',
             'created_at'
         ]
+        read_only_fields = ['anomaly_score', 'is_anomaly']
+
+
+# Columns to read from .values() for fields whose source isn't a plain column
+EXPENSE_VALUE_SOURCES = {
+    "category": "category_id",
+    "category_name": "category__name",
+}
+
+
+def serialize_expense_values(queryset, fields=None, archive_queryset=None):
+    """
+    Read-only fast path for expense lists: builds the same output as
+    ExpenseSerializer(many=True) straight from .values() rows, without model instances.
+    Tags are fetched with one extra query for the whole list.
+    With `archive_queryset`, archived expenses are merged in with a UNION, newest first.
+    """
+    serializer_fields = ExpenseSerializer(fields=fields).fields
+    names = list(serializer_fields)
+    columns = sorted({"id"} | {EXPENSE_VALUE_SOURCES.get(n, n) for n in names if n != "tag"})
+
+    if archive_queryset is None:
+        rows = list(queryset.values(*columns))
+    else:
+        columns = sorted(set(columns) | {"date", "created_at"})
+        rows = list(
+            queryset.order_by().values(*columns)
+            .union(archive_queryset.order_by().values(*columns), all=True)
+            .order_by("-date", "-created_at")
+        )
+
+    tags = {}
+    if "tag" in names and rows:
+        through = (
+            Expense.tag.through.objects.filter(expense_id__in=queryset.values("id"))
+            .order_by("id")
+            .values_list("expense_id", "tag_id")
+        )
+        if archive_queryset is not None:
+            through = list(through) + list(
+                ArchivedExpense.tag.through.objects.filter(archivedexpense_id__in=archive_queryset.values("id"))
+                .order_by("id")
+                .values_list("archivedexpense_id", "tag_id")
+            )
+        for expense_id, tag_id in through:
+            tags.setdefault(expense_id, []).append(tag_id)
+
+    converters = []
+    for name in names:
+        to_representation = serializer_fields[name].to_representation
+        if isinstance(serializer_fields[name], serializers.RelatedField):
+            # Related fields expect an object with .pk, as DRF passes for pk-only lookups
+            to_representation = (lambda rep: lambda pk: rep(PKOnlyObject(pk=pk)))(to_representation)
+        converters.append((name, EXPENSE_VALUE_SOURCES.get(name, name), to_representation))
+
+    data = []
+    for row in rows:
+        item = {}
+        for name, source, to_representation in converters:
+            if name == "tag":
+                item[name] = tags.get(row["id"], [])
+                continue
+            value = row[source]
+            if value is None:
+                # DRF skips a dotted source whose parent (category) is missing
+                if name != "category_name":
+                    item[name] = None
+            else:
+                item[name] = to_representation(value)
+        data.append(item)
+    return data
+
+
+class RecurringExpenseSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(
+        source="category.name", read_only=True
+    )
+
+    class Meta:
+        model = RecurringExpense
+        fields = [
+            'id',
+            'amount',
+            'description',
+            'category',
+            'category_name',
+            'frequency',
+            'interval',
+            'start_date',
+            'end_date',
+            'next_date',
+            'active',
+        ]
+        read_only_fields = ['next_date']
+
+    def validate_category(self, category):
+        user_id = self.context.get("user_id")
+        if category and user_id and category.user_id != user_id:
+            raise serializers.ValidationError("Unknown category.")
+        return category
+
+    def validate_interval(self, value):
+        if value < 1:
+            raise serializers.ValidationError("Interval must be at least 1.")
+        return value
+
+    def validate(self, attrs):
+        start = attrs.get("start_date", getattr(self.instance, "start_date", None))
+        end = attrs.get("end_date", getattr(self.instance, "end_date", None))
+        if start and end and end < start:
+            raise serializers.ValidationError({"end_date": "End date must be on or after start date."})
+        return attrs
+
+
+class BudgetSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(
+        source="category.name", read_only=True
+    )
+    # filled from the CategorySpend counters: passed in the context by list,
+    # read for the current period when a single budget is serialized
+    spent = serializers.SerializerMethodField()
+    remaining = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Budget
+        fields = ['id', 'category', 'category_name', 'amount', 'spent', 'remaining']
+
+    def validate_category(self, category):
+        user_id = self.context.get("user_id")
+        if user_id and category.user_id != user_id:
+            raise serializers.ValidationError("Unknown category.")
+
+        duplicate = Budget.objects.filter(user_id=category.user_id, category=category)
+        if self.instance:
+            duplicate = duplicate.exclude(pk=self.instance.pk)
+        if duplicate.exists():
+            raise serializers.ValidationError("A budget already exists for this category.")
+        return category
+
+    def _status(self, obj):
+        status = self.context.setdefault("budget_status", {})
+        if obj.id not in status:
+            period_start = get_period_start(obj.user_id, date.today())
+            status.update(get_budget_status(obj.user_id, [obj], period_start))
+        return status[obj.id]
+
+    def get_spent(self, obj):
+        return self.fields["amount"].to_representation(self._status(obj)[0])
+
+    def get_remaining(self, obj):
+        return self.fields["amount"].to_representation(self._status(obj)[1])
+
+
+class CategoryRuleSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(
+        source="category.name", read_only=True
+    )
+
+    class Meta:
+        model = CategoryRule
+        fields = ['id', 'kind', 'pattern', 'min_amount', 'max_amount', 'priority', 'category', 'category_name']
+        # The view may fill the category from category_name instead
+        extra_kwargs = {'category': {'required': False}}
+
+    def validate_category(self, category):
+        user_id = self.context.get("user_id")
+        if user_id and category.user_id != user_id:
+            raise serializers.ValidationError("Unknown category.")
+        return category
+
+    def validate(self, attrs):
+        def current(name):
+            return attrs.get(name, getattr(self.instance, name, None))
+
+        kind = current("kind") or "keyword"
+        pattern = (current("pattern") or "").strip()
+        low, high = current("min_amount"), current("max_amount")
+
+        if not self.instance and "category" not in attrs and not self.context.get("has_category_name"):
+            raise serializers.ValidationError({"category": "A category or category_name is required."})
+        if kind in ("keyword", "regex") and not pattern:
+            raise serializers.ValidationError({"pattern": "This rule needs a pattern."})
+        if kind == "regex":
+            try:
+                check_regex(pattern)
+            except ValueError as e:
+                raise serializers.ValidationError({"pattern": str(e)})
+        if kind == "amount" and low is None and high is None:
+            raise serializers.ValidationError({"min_amount": "Amount rules need a minimum or maximum."})
+        if low is not None and high is not None and low > high:
+            raise serializers.ValidationError({"max_amount": "Maximum must be at least the minimum."})
+        return attrs
 
 
 class UserSettingSerializer(serializers.ModelSerializer):
     class Meta:
         model = userSetting
-        fields = ['theme']
+        fields = ['theme', 'month_start_date']
+
+    def validate_month_start_date(self, value):
+        if not 1 <= value <= 28:
+            raise serializers.ValidationError("Month start day must be between 1 and 28.")
+        return value
@@ -1,7 +1,29 @@
-from datetime import date, timedelta
-from django.db.models import Sum
-from .models import userSetting, Expense
-from .helpers import get_custom_month_range
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import hashlib
+import json
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum, Count, Avg
+from django.utils import timezone
+from .models import (
+    userSetting,
+    Category,
+    Tag,
+    Expense,
+    ArchivedExpense,
+    ExpenseRollup,
+    CategorySpend,
+    RecurringExpense,
+    Insight,
+    Tombstone,
+    AIUsage,
+)
+from .helpers import get_custom_month_range, next_occurrence
+from . import lookups, anomalies
+from .ai.client import generate_insights
+from .ai.usage import attribute_usage
 
 def get_date_range(user_id, period, ref_date=None, start_param=None, end_param=None):
     """
@@ -37,14 +59,8 @@ def get_date_range(user_id, period, ref_date=None, start_param=None, end_param=N
         return start, end, prev_start, prev_end
 
     # 4. Monthly (Default)
-    # Get user settings for custom start day
-    start_day = 1
-    # Settings logic removed as month_start_date was removed from UserSetting model
-    # try:
-    #     settings = userSetting.objects.get(user_id=user_id)
-    #     start_day = settings.month_start_date
-    # except userSetting.DoesNotExist:
-    #     pass
+    # Custom start day from the user's settings (cached, see lookups.get_user_settings)
+    start_day = lookups.get_user_settings(user_id)["month_start_date"]
 
     start, end = get_custom_month_range(ref_date, start_day)
     period_len = (end - start).days + 1
@@ -56,15 +72,16 @@ def get_date_range(user_id, period, ref_date=None, start_param=None, end_param=N
 def get_expense_summary(queryset):
     """
     Calculates total and category breakdown for a given queryset.
+    Totals stay Decimal; the JSON renderer converts them for responses.
     """
-    total = queryset.aggregate(total=Sum("amount"))["total"] or 0
-    count = queryset.count()
-    
-    grouped = (
+    # One grouped query; the overall total and count are the sums of the groups
+    grouped = list(
         queryset.values("category__id", "category__name")
-        .annotate(total=Sum("amount"))
+        .annotate(total=Sum("amount"), count=Count("id"))
         .order_by("-total")
     )
+    total = sum((row["total"] for row in grouped), Decimal(0))
+    count = sum(row["count"] for row in grouped)
 
     by_category = [
         {
@@ -74,4 +91,747 @@ def get_expense_summary(queryset):
         } for row in grouped
     ]
 
-    return float(total), count, by_category
+    return total, count, by_category
+
+
+def get_period_summary(user_id, start=None, end=None):
+    """
+    Like get_expense_summary, for a user's [start, end] (all time when unbounded),
+    including archived expenses through their daily rollups.
+    """
+    qs = Expense.objects.filter(user_id=user_id)
+    rollups = ExpenseRollup.objects.filter(user_id=user_id)
+    if start and end:
+        qs = qs.filter(date__gte=start, date__lte=end)
+        rollups = rollups.filter(date__gte=start, date__lte=end)
+
+    total, count, by_category = get_expense_summary(qs)
+
+    archived = list(
+        rollups.values("category__id", "category__name")
+        .annotate(total=Sum("total"), count=Sum("count"))
+        .order_by()
+    )
+    if not archived:
+        return total, count, by_category
+
+    # Sum in Decimal so the combined total is exactly what a single aggregate would give
+    merged = {row["id"]: dict(row) for row in by_category}
+    for row in archived:
+        total += row["total"]
+        count += row["count"]
+        entry = merged.setdefault(row["category__id"], {
+            "id": row["category__id"],
+            "name": row["category__name"] or "Uncategorized",
+            "total": Decimal(0),
+        })
+        entry["total"] += row["total"]
+
+    by_category = sorted(merged.values(), key=lambda row: row["total"], reverse=True)
+    return total, count, by_category
+
+
+def get_archive_watermark(user_id):
+    """Newest archived expense date for the user, or None when nothing is archived."""
+    return (
+        ArchivedExpense.objects.filter(user_id=user_id)
+        .order_by("-date")
+        .values_list("date", flat=True)
+        .first()
+    )
+
+
+def reaches_archive(user_id, start):
+    """True when a range starting at `start` (None = all time) includes some of the user's archived expenses."""
+    watermark = get_archive_watermark(user_id)
+    return watermark is not None and (start is None or start <= watermark)
+
+
+def archive_expenses(before, batch_size=1000):
+    """
+    Moves expenses dated before `before` into ArchivedExpense in batches, adding each
+    batch to the daily ExpenseRollup totals in the same transaction.
+    Spending doesn't change, so budget counters and anomaly stats are left alone.
+    Returns the number of expenses archived.
+    """
+    from .signals import mute_expense_signals
+
+    fields = ["id", "user_id", "amount", "description", "date", "category_id",
+              "anomaly_score", "is_anomaly", "created_at"]
+    through = Expense.tag.through
+    archived_through = ArchivedExpense.tag.through
+
+    moved = 0
+    while True:
+        ids = list(
+            Expense.objects.filter(date__lt=before).order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+
+        with transaction.atomic(), mute_expense_signals():
+            rows = list(Expense.objects.filter(id__in=ids).values(*fields))
+            tags = list(through.objects.filter(expense_id__in=ids).values_list("expense_id", "tag_id"))
+
+            ArchivedExpense.objects.bulk_create([ArchivedExpense(**row) for row in rows], batch_size=batch_size)
+            archived_through.objects.bulk_create(
+                [archived_through(archivedexpense_id=e, tag_id=t) for e, t in tags],
+                batch_size=batch_size,
+            )
+
+            buckets = {}
+            for row in rows:
+                key = (row["user_id"], row["category_id"], row["date"])
+                total, count = buckets.get(key, (0, 0))
+                buckets[key] = (total + row["amount"], count + 1)
+            ExpenseRollup.objects.bulk_create(
+                [
+                    ExpenseRollup(user_id=u, category_id=c, date=d, total=t, count=n)
+                    for (u, c, d), (t, n) in buckets.items()
+                ],
+                batch_size=batch_size,
+            )
+
+            through.objects.filter(expense_id__in=ids).delete()
+            Expense.objects.filter(id__in=ids).delete()
+
+        moved += len(rows)
+
+    return moved
+
+
+def get_anomalies(queryset, limit=5, archive_queryset=None):
+    """
+    Returns the most unusual flagged expenses in the queryset (and the matching
+    archived ones, if given), highest score first.
+    """
+    rows = []
+    for source in (queryset, archive_queryset):
+        if source is not None:
+            rows += (
+                source.filter(is_anomaly=True)
+                .order_by("-anomaly_score")
+                .values("id", "description", "amount", "date", "category__name", "anomaly_score")[:limit]
+            )
+    rows = sorted(rows, key=lambda row: row["anomaly_score"], reverse=True)[:limit]
+    return [
+        {
+            "id": row["id"],
+            "description": row["description"],
+            "amount": float(row["amount"]),
+            "date": row["date"].isoformat() if row["date"] else None,
+            "category": row["category__name"],
+            "score": round(row["anomaly_score"], 1),
+        } for row in rows
+    ]
+
+
+def get_insight_data(user_id, period, start, end, prev_start, prev_end):
+    """
+    Builds the summary dict sent to generate_insights for a period.
+    Returns (summary_data, previous_total); summary_data["total"] is 0 when there is nothing to analyse.
+    """
+    qs = Expense.objects.filter(user_id=user_id)
+
+    qs_current = qs
+    if start and end:
+        qs_current = qs.filter(date__gte=start, date__lte=end)
+
+    total, count, by_category = get_period_summary(user_id, start, end)
+
+    summary_data = {
+        "period": period,
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "total": total,
+        "count": count,
+        "by_category": by_category,
+    }
+    if total == 0:
+        summary_data["by_category"] = []
+        return summary_data, 0
+
+    # Previous Period Data (for comparison)
+    prev_total = 0
+    if prev_start and prev_end:
+        prev_total, _, _ = get_period_summary(user_id, prev_start, prev_end)
+
+    archived = None
+    if reaches_archive(user_id, start):
+        archived = ArchivedExpense.objects.filter(user_id=user_id)
+        if start and end:
+            archived = archived.filter(date__gte=start, date__lte=end)
+    summary_data["anomalies"] = get_anomalies(qs_current, archive_queryset=archived)
+    return summary_data, prev_total
+
+
+def get_insight_fingerprint(summary_data, previous_total):
+    # Changes whenever anything the insight is based on changes
+    payload = json.dumps([summary_data, previous_total], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_stored_insight(user_id, summary_data, fingerprint):
+    return (
+        Insight.objects.filter(
+            user_id=user_id,
+            period=summary_data["period"],
+            start=summary_data["start"],
+            end=summary_data["end"],
+            fingerprint=fingerprint,
+        )
+        .values_list("text", flat=True)
+        .first()
+    )
+
+
+def store_insight(user_id, summary_data, fingerprint, text):
+    Insight.objects.update_or_create(
+        user_id=user_id,
+        period=summary_data["period"],
+        start=summary_data["start"],
+        end=summary_data["end"],
+        defaults={"fingerprint": fingerprint, "text": text},
+    )
+
+
+def generate_insight_text(summary_data, previous_total):
+    """Calls the AI for an insight and returns its text, or None if it failed."""
+    try:
+        insight = generate_insights(summary_data, previous_total=previous_total)
+        if isinstance(insight, dict) and "text" in insight:
+            return insight["text"]
+        elif isinstance(insight, str):
+            return insight
+    except Exception as e:
+        print(f"AI Error: {e}")
+    return None
+
+
+def build_fallback_insight(summary, previous_total=None):
+    """
+    Plain-text insight built from the summary alone, used when the AI is unavailable
+    or the user is over their AI limit.
+    """
+    total = float(summary.get("total") or 0)
+    by_category = summary.get("by_category") or []
+    previous_total = float(previous_total or 0)
+
+    parts = [f"You have spent ₹{total:,.0f} across {summary.get('count', 0)} expenses this period."]
+    if by_category and total:
+        top = by_category[0]
+        top_total = float(top["total"])
+        parts.append(
+            f"{top['name']} is your top category at ₹{top_total:,.0f} ({top_total / total:.0%} of spending)."
+        )
+    if previous_total:
+        diff = total - previous_total
+        direction = "more" if diff > 0 else "less"
+        parts.append(f"That is ₹{abs(diff):,.0f} {direction} than the previous period.")
+    return " ".join(parts)
+
+
+def get_tag_summary(queryset, archive_queryset=None):
+    """
+    Calculates per-tag totals and a tag x category breakdown for a given queryset,
+    plus the matching archived expenses if given (their tag links are archived too).
+    Runs one grouped query over the expense/tag join table per source.
+    """
+    cells = {}
+    for source in (queryset, archive_queryset):
+        if source is None:
+            continue
+        grouped = (
+            source.filter(tag__isnull=False)
+            .values("tag__id", "tag__name", "category__id", "category__name")
+            .annotate(total=Sum("amount"), count=Count("id"))
+            .order_by()
+        )
+        for row in grouped:
+            cell = cells.setdefault((row["tag__id"], row["category__id"]), {
+                "tag_id": row["tag__id"],
+                "tag_name": row["tag__name"],
+                "category_id": row["category__id"],
+                "category_name": row["category__name"] or "Uncategorized",
+                "total": 0,
+                "count": 0,
+            })
+            cell["total"] += row["total"]
+            cell["count"] += row["count"]
+
+    cross_tab = sorted(cells.values(), key=lambda cell: cell["total"], reverse=True)
+
+    by_tag = {}
+    for cell in cross_tab:
+        tag = by_tag.setdefault(cell["tag_id"], {
+            "id": cell["tag_id"],
+            "name": cell["tag_name"],
+            "total": 0,
+            "count": 0,
+        })
+        tag["total"] += cell["total"]
+        tag["count"] += cell["count"]
+
+    by_tag = sorted(by_tag.values(), key=lambda t: t["total"], reverse=True)
+    return by_tag, cross_tab
+
+
+def get_period_start(user_id, day, start_day=None):
+    """
+    Returns the first day of the monthly period that `day` falls in for this user.
+    Loops over many rows pass the user's `start_day` to skip the settings lookup.
+    """
+    if start_day is None:
+        start_day = lookups.get_user_settings(user_id)["month_start_date"]
+    start, _ = get_custom_month_range(day, start_day)
+    return start
+
+
+def add_category_spend(user_id, category_id, period_start, delta):
+    """
+    Atomically adds `delta` to the user's running total for a category/period.
+    """
+    if not delta:
+        return
+    counter = CategorySpend.objects.filter(
+        user_id=user_id, category_id=category_id, period_start=period_start
+    )
+    if counter.update(total=F("total") + delta):
+        return
+    try:
+        with transaction.atomic():
+            CategorySpend.objects.create(
+                user_id=user_id, category_id=category_id, period_start=period_start, total=delta
+            )
+    except IntegrityError:
+        # Created concurrently by another request
+        counter.update(total=F("total") + delta)
+
+
+def update_spend_for_expense(expense, old=None, deleted=False):
+    """
+    Moves an expense's amount between CategorySpend counters after a write.
+    `old` is the (category_id, date, amount) the row had before the write, if any.
+    """
+    start_day = lookups.get_user_settings(expense.user_id)["month_start_date"]
+    buckets = {}
+    if old:
+        category_id, day, amount = old
+        if category_id and day:
+            key = (category_id, get_period_start(expense.user_id, day, start_day))
+            buckets[key] = buckets.get(key, 0) - Decimal(str(amount))
+    if not deleted and expense.category_id and expense.date:
+        key = (expense.category_id, get_period_start(expense.user_id, expense.date, start_day))
+        buckets[key] = buckets.get(key, 0) + Decimal(str(expense.amount))
+
+    for (category_id, period_start), delta in buckets.items():
+        add_category_spend(expense.user_id, category_id, period_start, delta)
+
+
+def record_bulk_spend(expenses):
+    """
+    Adds bulk-created expenses (which skip model signals) to the CategorySpend counters,
+    with one update per user/category/period.
+    """
+    buckets = {}
+    start_days = {}
+    for expense in expenses:
+        if expense.category_id and expense.date:
+            if expense.user_id not in start_days:
+                start_days[expense.user_id] = lookups.get_user_settings(expense.user_id)["month_start_date"]
+            period_start = get_period_start(expense.user_id, expense.date, start_days[expense.user_id])
+            key = (expense.user_id, expense.category_id, period_start)
+            buckets[key] = buckets.get(key, 0) + Decimal(str(expense.amount))
+
+    for (user_id, category_id, period_start), delta in buckets.items():
+        add_category_spend(user_id, category_id, period_start, delta)
+
+
+def rebuild_category_spend(user_ids=None):
+    """
+    Recomputes CategorySpend counters from Expense rows.
+    Rebuilds every user when `user_ids` is None. Returns the number of counters written.
+    """
+    expenses = Expense.objects.filter(category__isnull=False, date__isnull=False)
+    counters = CategorySpend.objects.all()
+    if user_ids is not None:
+        expenses = expenses.filter(user_id__in=user_ids)
+        counters = counters.filter(user_id__in=user_ids)
+
+    daily = (
+        expenses.values("user_id", "category_id", "date")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+
+    # Archived expenses still count, through their daily rollups
+    rollups = ExpenseRollup.objects.filter(category__isnull=False)
+    if user_ids is not None:
+        rollups = rollups.filter(user_id__in=user_ids)
+    archived_daily = (
+        rollups.values("user_id", "category_id", "date")
+        .annotate(total=Sum("total"))
+        .order_by()
+    )
+
+    totals = {}
+    start_days = {}
+    for source in (daily, archived_daily):
+        for row in source.iterator(chunk_size=5000):
+            user_id = row["user_id"]
+            if user_id not in start_days:
+                start_days[user_id] = lookups.get_user_settings(user_id, fresh=True)["month_start_date"]
+            key = (user_id, row["category_id"], get_period_start(user_id, row["date"], start_days[user_id]))
+            totals[key] = totals.get(key, 0) + row["total"]
+
+    with transaction.atomic():
+        counters.delete()
+        CategorySpend.objects.bulk_create(
+            [
+                CategorySpend(user_id=u, category_id=c, period_start=p, total=t)
+                for (u, c, p), t in totals.items()
+            ],
+            batch_size=1000,
+        )
+    return len(totals)
+
+
+def get_budget_status(user_id, budgets, period_start):
+    """
+    Returns {budget_id: (spent, remaining)} for the given period from the counters,
+    without aggregating Expense.
+    """
+    spent = dict(
+        CategorySpend.objects.filter(user_id=user_id, period_start=period_start)
+        .values_list("category_id", "total")
+    )
+    status = {}
+    for budget in budgets:
+        used = spent.get(budget.category_id, Decimal("0"))
+        status[budget.id] = (used, budget.amount - used)
+    return status
+
+
+def materialize_recurring(until=None, batch_size=1000):
+    """
+    Creates the Expense rows for every RecurringExpense occurrence due on or before `until`,
+    across all users. Templates are processed `batch_size` at a time; each batch is locked,
+    bulk-inserted and has its next_date advanced in one transaction, so reruns are no-ops.
+    Returns (templates_processed, expenses_created).
+    """
+    until = until or date.today()
+    due = RecurringExpense.objects.filter(active=True, next_date__lte=until).order_by("id")
+
+    templates_done = 0
+    created = 0
+    last_id = 0
+    while True:
+        ids = list(due.filter(id__gt=last_id).values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        with transaction.atomic():
+            templates = list(
+                RecurringExpense.objects.select_for_update(skip_locked=True)
+                .filter(id__in=ids, active=True, next_date__lte=until)
+            )
+            if not templates:
+                continue
+
+            # Occurrences already inserted by an earlier, interrupted run
+            batch_expenses = Expense.objects.filter(
+                recurring_id__in=[t.id for t in templates],
+                date__gte=min(t.next_date for t in templates),
+            )
+            existing = set(batch_expenses.values_list("recurring_id", "date"))
+
+            rows = []
+            for template in templates:
+                day = template.next_date
+                while day <= until and (template.end_date is None or day <= template.end_date):
+                    if (template.id, day) not in existing:
+                        rows.append(Expense(
+                            user_id=template.user_id,
+                            amount=template.amount,
+                            description=template.description,
+                            date=day,
+                            category_id=template.category_id,
+                            recurring_id=template.id,
+                        ))
+                    day = next_occurrence(day, template.frequency, template.interval, template.start_date.day)
+
+                template.next_date = day
+                if template.end_date and day > template.end_date:
+                    template.active = False
+
+            anomalies.score_expenses(rows)
+            Expense.objects.bulk_create(rows, batch_size=batch_size)
+            RecurringExpense.objects.bulk_update(templates, ["next_date", "active"], batch_size=batch_size)
+            record_bulk_spend(rows)
+            anomalies.mark_stale({row.category_id: row.user_id for row in rows})
+            if rows:
+                touch_expenses_on_commit(batch_expenses)
+
+        templates_done += len(templates)
+        created += len(rows)
+
+    return templates_done, created
+
+
+def get_history_ranges(start, end, period, count):
+    """
+    Returns the `count` periods before [start, end], oldest first, as (start, end) pairs.
+    Monthly periods follow the user's month boundaries; others (weekly, or "custom" for
+    an explicit start/end) repeat the same length.
+    """
+    ranges = []
+    if period == "monthly":
+        for _ in range(count):
+            start, end = get_custom_month_range(start - timedelta(days=1), start.day)
+            ranges.append((start, end))
+    else:
+        length = (end - start).days + 1
+        for _ in range(count):
+            start, end = start - timedelta(days=length), start - timedelta(days=1)
+            ranges.append((start, end))
+    return ranges[::-1]
+
+
+def get_spend_forecast(user_id, start, end, today, period="monthly", history=6):
+    """
+    Projects the end-of-period total and per-category totals for [start, end].
+
+    Expected spend = spent so far + average of what past periods spent after the same
+    number of elapsed days. Falls back to a straight run-rate without any history.
+    Uses one grouped query of daily totals for the current and `history` past periods.
+    """
+    ranges = get_history_ranges(start, end, period, history) + [(start, end)]
+    elapsed = min(max((today - start).days + 1, 0), (end - start).days + 1)
+
+    rows = list(
+        Expense.objects.filter(user_id=user_id, date__gte=ranges[0][0], date__lte=end)
+        .values_list("date", "category_id", "category__name")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    if reaches_archive(user_id, ranges[0][0]):
+        # Archived history comes from the daily rollups, which have the same shape
+        rows += (
+            ExpenseRollup.objects.filter(user_id=user_id, date__gte=ranges[0][0], date__lte=end)
+            .values_list("date", "category_id", "category__name")
+            .annotate(total=Sum("total"))
+            .order_by()
+        )
+
+    names = {None: "Uncategorized"}
+    if rows:
+        days, cat_ids, cat_names, totals = zip(*rows)
+        names.update(zip(cat_ids, cat_names))
+        days = np.array(days, dtype="datetime64[D]").astype(np.int64)
+        totals = np.array(totals, dtype=np.float64)
+        categories, cat_index = np.unique(
+            np.array([-1 if c is None else c for c in cat_ids]), return_inverse=True
+        )
+    else:
+        days = np.empty(0, dtype=np.int64)
+        totals = np.empty(0)
+        categories, cat_index = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # Bucket every daily total into (period, category), split at the elapsed-day offset
+    starts = np.array([s for s, _ in ranges], dtype="datetime64[D]").astype(np.int64)
+    period_index = np.searchsorted(starts, days, side="right") - 1
+    before_cutoff = (days - starts[period_index]) < elapsed
+
+    n_periods, n_cats = len(ranges), categories.size
+    flat = period_index * n_cats + cat_index
+    size = n_periods * n_cats
+    period_totals = np.bincount(flat, weights=totals, minlength=size).reshape(n_periods, n_cats)
+    to_date = np.bincount(
+        flat[before_cutoff], weights=totals[before_cutoff], minlength=size
+    ).reshape(n_periods, n_cats)
+
+    spent = to_date[-1]
+    # Only periods the user already had data in count as history
+    past_active = period_totals[:-1].sum(axis=1) > 0
+    if past_active.any():
+        remaining = (period_totals[:-1] - to_date[:-1])[past_active].mean(axis=0)
+        projected = spent + remaining
+        method = "history"
+    else:
+        projected = spent * ((end - start).days + 1) / elapsed if elapsed else spent
+        method = "run_rate"
+
+    by_category = sorted(
+        (
+            {
+                "id": None if c == -1 else int(c),
+                "name": names[None if c == -1 else int(c)] or "Uncategorized",
+                "spent": round(float(spent[i]), 2),
+                "projected": round(float(projected[i]), 2),
+            }
+            for i, c in enumerate(categories.tolist())
+            if spent[i] or projected[i]
+        ),
+        key=lambda row: row["projected"],
+        reverse=True,
+    )
+
+    return {
+        "elapsed_days": elapsed,
+        "spent": round(float(spent.sum()), 2),
+        "projected_total": round(float(projected.sum()), 2),
+        "method": method,
+        "history_periods": int(past_active.sum()),
+        "by_category": by_category,
+    }
+
+
+def precompute_insights(period="monthly", ref_date=None, active_days=35, workers=4):
+    """
+    Generates and stores insights for every user with expenses in the last `active_days`.
+    Summaries are built sequentially; only the AI calls run in a bounded thread pool,
+    and users whose stored insight already matches their data are skipped.
+    Returns (users_checked, insights_generated, failures).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    ref_date = ref_date or date.today()
+    user_ids = (
+        Expense.objects.filter(date__gte=ref_date - timedelta(days=active_days))
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+
+    pending = []
+    checked = 0
+    for user_id in user_ids.iterator():
+        checked += 1
+        start, end, prev_start, prev_end = get_date_range(user_id, period, ref_date)
+        summary_data, prev_total = get_insight_data(user_id, period, start, end, prev_start, prev_end)
+        if summary_data["total"] == 0:
+            continue
+        fingerprint = get_insight_fingerprint(summary_data, prev_total)
+        if get_stored_insight(user_id, summary_data, fingerprint):
+            continue
+        pending.append((user_id, summary_data, prev_total, fingerprint))
+
+    def generate(job):
+        user_id, summary_data, prev_total, _ = job
+        try:
+            with attribute_usage(user_id, "insights-precompute"):
+                return generate_insight_text(summary_data, prev_total)
+        finally:
+            # Usage rows are written from the pool threads
+            connection.close()
+
+    generated = 0
+    failures = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        texts = pool.map(generate, pending)
+        for (user_id, summary_data, _, fingerprint), text in zip(pending, texts):
+            if text:
+                store_insight(user_id, summary_data, fingerprint, text)
+                generated += 1
+            else:
+                failures += 1
+
+    return checked, generated, failures
+
+
+SYNC_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_sync_cursor(moment):
+    # Microseconds since the epoch; integer math so the cursor round-trips exactly
+    return str((moment - SYNC_EPOCH) // timedelta(microseconds=1))
+
+
+def decode_sync_cursor(cursor):
+    """Raises ValueError for anything that isn't a cursor issued by encode_sync_cursor."""
+    micros = int(cursor)
+    if micros < 0:
+        raise ValueError("negative cursor")
+    return SYNC_EPOCH + timedelta(microseconds=micros)
+
+
+def touch_expenses(queryset):
+    """Marks expenses as changed for /api/sync/ after writes that bypass save()."""
+    return queryset.update(updated_at=timezone.now())
+
+
+def touch_expenses_on_commit(queryset):
+    """
+    For bulk writers whose transaction can outlast SYNC_LAG_SECONDS. updated_at is set
+    when a row is written, not when it commits, so a sync cursor issued in between can
+    already be past it; stamping the rows again in one short statement right after the
+    commit puts them after any such cursor.
+    """
+    transaction.on_commit(lambda: touch_expenses(queryset))
+
+
+def get_sync_changes(user_id, since=None, limit=500, now=None):
+    """
+    Expenses, categories, tags and tombstones changed after `since` (None = everything
+    live, without tombstones), up to a watermark SYNC_LAG_SECONDS in the past.
+    When a type has more than `limit` changes the watermark is pulled back to its
+    `limit`-th row, keeping every row tied with it, so the next page can start strictly
+    after the watermark. Returns (watermark, has_more, {type: queryset}).
+    """
+    until = (now or timezone.now()) - timedelta(seconds=settings.SYNC_LAG_SECONDS)
+    if since is not None and until <= since:
+        until = since
+
+    sources = {
+        "expenses": (Expense.objects.filter(user_id=user_id), "updated_at"),
+        "categories": (Category.objects.filter(user_id=user_id), "updated_at"),
+        "tags": (Tag.objects.filter(user_id=user_id), "updated_at"),
+    }
+    if since is not None:
+        sources["deleted"] = (Tombstone.objects.filter(user_id=user_id), "deleted_at")
+
+    def window(queryset, field, upper):
+        queryset = queryset.filter(**{f"{field}__lte": upper})
+        if since is not None:
+            queryset = queryset.filter(**{f"{field}__gt": since})
+        return queryset.order_by(field, "id")
+
+    has_more = False
+    for queryset, field in sources.values():
+        edge = list(window(queryset, field, until).values_list(field, flat=True)[limit - 1:limit + 1])
+        if len(edge) > 1:
+            has_more = True
+            until = min(until, edge[0])
+
+    return until, has_more, {name: window(qs, field, until) for name, (qs, field) in sources.items()}
+
+
+def prune_tombstones(before):
+    """Deletes tombstones older than `before`. Returns the number removed."""
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=before).delete()
+    return deleted
+
+
+def get_ai_usage_summary(user_id=None, since=None):
+    """
+    AI calls aggregated per user, endpoint and model (optionally for one user / since a datetime),
+    most expensive first.
+    """
+    qs = AIUsage.objects.all()
+    if user_id is not None:
+        qs = qs.filter(user_id=user_id)
+    if since is not None:
+        qs = qs.filter(created_at__gte=since)
+
+    return list(
+        qs.values("user_id", "endpoint", "model")
+        .annotate(
+            calls=Count("id"),
+            prompt_tokens=Sum("prompt_tokens"),
+            response_tokens=Sum("response_tokens"),
+            thinking_tokens=Sum("thinking_tokens"),
+            cost_usd=Sum("cost_usd"),
+            avg_latency_ms=Avg("latency_ms"),
+        )
+        .order_by(F("cost_usd").desc(nulls_last=True), "user_id", "endpoint")
+    )
@@ -0,0 +1,129 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import Category, Tag, Expense, Tombstone, userSetting
+from . import lookups, anomalies
+from .services import update_spend_for_expense, touch_expenses, rebuild_category_spend
+
+
+# A newly created row can't make a cached name -> id entry stale, so only
+# renames and deletes drop the user's map.
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_lookups(sender, instance, created=False, **kwargs):
+    if not created:
+        lookups.invalidate_categories(instance.user_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_lookups(sender, instance, created=False, **kwargs):
+    if not created:
+        lookups.invalidate_tags(instance.user_id)
+
+
+@receiver(pre_save, sender=userSetting)
+def remember_month_start(sender, instance, raw=False, **kwargs):
+    instance._old_month_start = (
+        userSetting.objects.filter(pk=instance.pk).values_list("month_start_date", flat=True).first()
+        if instance.pk else None
+    )
+
+
+def _month_start_changed(user_id, old_day, new_day):
+    lookups.invalidate_user_settings(user_id)
+    # Budget counters are keyed by period start, so a new start day re-buckets them
+    if old_day != new_day:
+        transaction.on_commit(lambda: rebuild_category_spend([user_id]))
+
+
+@receiver(post_save, sender=userSetting)
+def invalidate_user_settings_on_save(sender, instance, **kwargs):
+    old_day = getattr(instance, "_old_month_start", None) or 1
+    _month_start_changed(instance.user_id, old_day, instance.month_start_date)
+
+
+@receiver(post_delete, sender=userSetting)
+def invalidate_user_settings_on_delete(sender, instance, **kwargs):
+    # Back to the default start day
+    _month_start_changed(instance.user_id, instance.month_start_date, 1)
+
+
+# Sync bookkeeping: deletes leave a Tombstone, and expenses that lose their category
+# or a tag through a cascade get a new updated_at (the cascade itself skips auto_now).
+@receiver(pre_delete, sender=Category)
+def touch_expenses_of_category(sender, instance, **kwargs):
+    touch_expenses(Expense.objects.filter(category=instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def touch_expenses_of_tag(sender, instance, **kwargs):
+    touch_expenses(Expense.objects.filter(tag=instance))
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Tag)
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(user_id=instance.user_id, model=sender._meta.model_name, object_id=instance.pk)
+
+
+# Bulk jobs that move expenses without changing spending (archival) mute the
+# per-row expense handlers below.
+_muted = ContextVar("expense_signals_muted", default=False)
+
+
+@contextmanager
+def mute_expense_signals():
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+# Amount statistics are not recomputed per write: the touched categories are flagged
+# and `refresh_anomalies --stale` rebuilds them in batch.
+@receiver(pre_save, sender=Expense)
+def score_expense_on_save(sender, instance, raw=False, **kwargs):
+    if raw or _muted.get():
+        return
+    old = getattr(instance, "_loaded_spend", None)
+    if old and old[0] == instance.category_id and old[2] == instance.amount:
+        return
+    # Scored against the stats before this write, so the row doesn't vouch for itself
+    instance.anomaly_score, instance.is_anomaly, instance._stats_stale = anomalies.score_expense(
+        instance.category_id, instance.amount
+    )
+
+
+@receiver(post_save, sender=Expense)
+def update_spend_on_save(sender, instance, created=False, **kwargs):
+    if _muted.get():
+        return
+    old = None if created else getattr(instance, "_loaded_spend", None)
+    update_spend_for_expense(instance, old=old)
+    if old != (instance.category_id, instance.date, instance.amount):
+        owners = {}
+        if old and old[0] != instance.category_id:
+            owners[old[0]] = instance.user_id
+        # Already flagged (seen while scoring) needs no second write
+        if getattr(instance, "_stats_stale", None) is not True:
+            owners[instance.category_id] = instance.user_id
+        anomalies.mark_stale(owners)
+    instance._stats_stale = None
+    instance._remember_spend()
+
+
+@receiver(post_delete, sender=Expense)
+def update_spend_on_delete(sender, instance, **kwargs):
+    if _muted.get():
+        return
+    old = getattr(instance, "_loaded_spend", None)
+    update_spend_for_expense(instance, old=old, deleted=True)
+    if old:
+        anomalies.mark_stale({old[0]: instance.user_id})
+    Tombstone.objects.create(user_id=instance.user_id, model="expense", object_id=instance.pk)
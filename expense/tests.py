@@ -0,0 +1,720 @@
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+import jwt
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tracker import db_router
+
+from . import anomalies, categorize, lookups, ratelimit, rules
+from .ai import client as ai_client
+from .helpers import get_custom_month_range
+from .models import (
+    ArchivedExpense, Budget, Category, CategoryAmountStats, CategoryRule, CategorySpend, Expense,
+    IdempotencyKey, RecurringExpense, Tag, userSetting,
+)
+from .services import archive_expenses, get_period_summary, get_sync_changes, materialize_recurring
+
+
+def clear_caches():
+    # The lookup maps are per process and outlive each test's rolled-back rows
+    cache.clear()
+    for user_id in ("u1", "u2"):
+        lookups.invalidate_categories(user_id)
+        lookups.invalidate_tags(user_id)
+
+
+def api_client(user_id):
+    # ClerkAuthentication only reads the `sub` claim
+    client = APIClient()
+    token = jwt.encode({"sub": user_id}, "test-secret-key-with-32-bytes!!!", algorithm="HS256")
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+class ArchivedReadsTests(TestCase):
+    """Analytics over ranges that reach into the archive include the archived expenses."""
+
+    def setUp(self):
+        clear_caches()
+        self.client = api_client("u1")
+        self.food = Category.objects.create(user_id="u1", name="Food")
+        self.trip = Tag.objects.create(user_id="u1", name="Trip")
+
+    def add_expense(self, day, amount, tagged=False):
+        expense = Expense.objects.create(user_id="u1", amount=Decimal(amount), date=day, category=self.food)
+        if tagged:
+            expense.tag.add(self.trip)
+        return expense
+
+    def test_tag_summary_includes_archived_expenses(self):
+        self.add_expense(date(2024, 3, 5), "40.00", tagged=True)
+        self.add_expense(date(2024, 3, 6), "15.00")
+        self.add_expense(date(2024, 4, 2), "10.00", tagged=True)
+        archive_expenses(before=date(2024, 4, 1))
+        self.assertEqual(ArchivedExpense.objects.count(), 2)
+
+        response = self.client.get("/api/expenses/tag-summary/?start=2024-03-01&end=2024-04-30")
+
+        self.assertEqual(response.status_code, 200)
+        by_tag = response.json()["by_tag"]
+        self.assertEqual(len(by_tag), 1)
+        self.assertEqual(Decimal(str(by_tag[0]["total"])), Decimal("50.00"))
+        self.assertEqual(by_tag[0]["count"], 2)
+        cell, = response.json()["by_tag_category"]
+        self.assertEqual((cell["tag_name"], cell["category_name"], cell["count"]), ("Trip", "Food", 2))
+
+    def test_tag_summary_skips_archive_outside_range(self):
+        self.add_expense(date(2024, 3, 5), "40.00", tagged=True)
+        self.add_expense(date(2024, 4, 2), "10.00", tagged=True)
+        archive_expenses(before=date(2024, 4, 1))
+
+        response = self.client.get("/api/expenses/tag-summary/?start=2024-04-01&end=2024-04-30")
+
+        self.assertEqual(Decimal(str(response.json()["by_tag"][0]["total"])), Decimal("10.00"))
+
+    def test_period_summary_stays_exact(self):
+        for day, amount in ((date(2024, 3, 5), "0.10"), (date(2024, 3, 6), "0.20"), (date(2024, 4, 2), "0.30")):
+            self.add_expense(day, amount)
+        archive_expenses(before=date(2024, 4, 1))
+
+        total, count, by_category = get_period_summary("u1", date(2024, 3, 1), date(2024, 4, 30))
+
+        self.assertEqual((total, count), (Decimal("0.60"), 3))
+        self.assertIsInstance(total, Decimal)
+        self.assertEqual(by_category[0]["total"], Decimal("0.60"))
+
+        response = self.client.get("/api/expenses/summary/?start=2024-03-01&end=2024-04-30")
+        self.assertEqual(response.json()["total"], 0.6)
+
+    def test_forecast_uses_archived_history(self):
+        for day in (date(2024, 2, 3), date(2024, 2, 20), date(2024, 3, 3), date(2024, 3, 20)):
+            self.add_expense(day, "30.00")
+        self.add_expense(date(2024, 4, 3), "30.00")
+        archive_expenses(before=date(2024, 4, 1))
+
+        response = self.client.get(
+            "/api/expenses/forecast/?start=2024-04-01&end=2024-04-30&date=2024-04-10&history=2"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        forecast = response.json()
+        self.assertEqual(forecast["method"], "history")
+        self.assertEqual(forecast["history_periods"], 2)
+        # 30 spent so far + 30 that past months spent after day 10
+        self.assertEqual(forecast["projected_total"], 60.0)
+
+
+class ExpenseCreateQueriesTests(TestCase):
+    """Cached category and tag names don't cost a query per request."""
+
+    def setUp(self):
+        clear_caches()
+        self.client = api_client("u1")
+        self.body = {
+            "amount": "12.50", "date": "2024-05-02", "description": "lunch",
+            "category_name": "Food", "tag_names": ["Work"],
+        }
+
+    def test_create_with_cached_names(self):
+        self.client.post("/api/expenses/", self.body, format="json")
+
+        # savepoint, stats read, insert, spend counter, tag read + insert, release,
+        # and the tags for the response
+        with self.assertNumQueries(8):
+            response = self.client.post("/api/expenses/", self.body, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Category.objects.filter(user_id="u1").count(), 1)
+        self.assertEqual(Tag.objects.filter(user_id="u1").count(), 1)
+
+
+class BudgetCounterTests(TestCase):
+    """Budget spent/remaining follow expense writes through the CategorySpend counters."""
+
+    def setUp(self):
+        clear_caches()
+        self.client = api_client("u1")
+        self.food = Category.objects.create(user_id="u1", name="Food")
+        self.travel = Category.objects.create(user_id="u1", name="Travel")
+        self.budget = Budget.objects.create(user_id="u1", category=self.food, amount=Decimal("100.00"))
+
+    def spent(self):
+        response = self.client.get(f"/api/budgets/{self.budget.id}/")
+        self.assertEqual(response.status_code, 200)
+        return Decimal(str(response.json()["spent"]))
+
+    def add_expense(self, amount):
+        response = self.client.post("/api/expenses/", {
+            "amount": amount, "date": date.today().isoformat(), "category": self.food.id,
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.json()["id"]
+
+    def test_create_and_update_return_status(self):
+        self.add_expense("30.00")
+
+        response = self.client.patch(f"/api/budgets/{self.budget.id}/", {"amount": "80.00"}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.json()["spent"]), Decimal("30.00"))
+        self.assertEqual(Decimal(response.json()["remaining"]), Decimal("50.00"))
+
+        response = self.client.post("/api/budgets/", {"category": self.travel.id, "amount": "20.00"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.json()["spent"]), Decimal("0"))
+        self.assertEqual(Decimal(response.json()["remaining"]), Decimal("20.00"))
+
+    def test_list_and_retrieve_agree(self):
+        self.add_expense("30.00")
+
+        listed, = self.client.get("/api/budgets/").json()["budgets"]
+
+        self.assertEqual(Decimal(listed["spent"]), self.spent())
+
+    def test_expense_create_update_delete(self):
+        expense_id = self.add_expense("30.00")
+        self.add_expense("5.00")
+        self.assertEqual(self.spent(), Decimal("35.00"))
+
+        url = f"/api/expenses/{expense_id}/"
+        self.client.patch(url, {"amount": "45.00"}, format="json")
+        self.assertEqual(self.spent(), Decimal("50.00"))
+
+        self.client.patch(url, {"category": self.travel.id}, format="json")
+        self.assertEqual(self.spent(), Decimal("5.00"))
+
+        self.client.patch(url, {"category": self.food.id}, format="json")
+        self.assertEqual(self.spent(), Decimal("50.00"))
+
+        # Into the previous period
+        self.client.patch(url, {"date": (date.today() - timedelta(days=40)).isoformat()}, format="json")
+        self.assertEqual(self.spent(), Decimal("5.00"))
+
+        self.client.patch(url, {"date": date.today().isoformat()}, format="json")
+        self.assertEqual(self.spent(), Decimal("50.00"))
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.spent(), Decimal("5.00"))
+
+
+class AnomalyScoringTests(TestCase):
+    """Robust z-scores per category, and the stale-statistics refresh."""
+
+    def setUp(self):
+        clear_caches()
+        self.food = Category.objects.create(user_id="u1", name="Food")
+
+    def add_expenses(self, amounts, day=None):
+        for amount in amounts:
+            Expense.objects.create(
+                user_id="u1", amount=Decimal(amount), date=day or date.today(), category=self.food
+            )
+
+    def test_identical_amounts_score_zero(self):
+        self.add_expenses(["9.99"] * 10)
+        anomalies.refresh_stats(category_ids=[self.food.id])
+
+        self.assertEqual(anomalies.score_expense(self.food.id, Decimal("9.99"))[:2], (0.0, False))
+        self.assertTrue(anomalies.score_expense(self.food.id, Decimal("30.00"))[1])
+
+    def test_outlier_is_flagged(self):
+        self.add_expenses([str(amount) for amount in range(10, 20)])
+        anomalies.refresh_stats(category_ids=[self.food.id])
+
+        z, flagged, _ = anomalies.score_expense(self.food.id, Decimal("15"))
+        self.assertFalse(flagged)
+        self.assertLess(abs(z), 1)
+        self.assertTrue(anomalies.score_expense(self.food.id, Decimal("200"))[1])
+
+    def test_too_little_history_is_not_scored(self):
+        self.add_expenses(["10", "12", "11"])
+        anomalies.refresh_stats(category_ids=[self.food.id])
+
+        self.assertEqual(anomalies.score_expense(self.food.id, Decimal("500"))[:2], (None, False))
+
+    def test_stale_refresh_flags_recent_expenses(self):
+        self.add_expenses([str(amount) for amount in range(10, 20)], day=date.today() - timedelta(days=60))
+        self.add_expenses(["250"])
+        # Every write marks the category stale; nothing is scored until the refresh
+        self.assertTrue(CategoryAmountStats.objects.get(category=self.food).stale)
+        self.assertFalse(Expense.objects.filter(is_anomaly=True).exists())
+
+        refreshed, scored, flagged = anomalies.refresh_stale_stats()
+
+        self.assertEqual((refreshed, scored, flagged), (1, 1, 1))
+        self.assertFalse(CategoryAmountStats.objects.get(category=self.food).stale)
+        self.assertEqual(Expense.objects.get(is_anomaly=True).amount, Decimal("250"))
+
+
+class ReplicaRoutingTests(TestCase):
+    """Read-only actions go to the replica, except right after the user wrote something."""
+
+    def setUp(self):
+        clear_caches()
+        self.client = api_client("u1")
+
+    def test_router_uses_replica_only_inside_use_replica(self):
+        router = db_router.ReadReplicaRouter()
+        with mock.patch.object(db_router, "replica_configured", return_value=True):
+            self.assertEqual(router.db_for_read(Expense), "default")
+            token = db_router.use_replica()
+            try:
+                self.assertEqual(router.db_for_read(Expense), "replica")
+                self.assertEqual(router.db_for_write(Expense), "default")
+            finally:
+                db_router.release_replica(token)
+            self.assertEqual(router.db_for_read(Expense), "default")
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        with mock.patch.object(db_router, "use_replica", wraps=db_router.use_replica) as use_replica:
+            self.client.get("/api/expenses/")
+            self.assertEqual(use_replica.call_count, 1)
+
+            response = self.client.post("/api/expenses/", {"amount": "5.00", "date": "2024-05-02"}, format="json")
+            self.assertEqual(response.status_code, 201)
+            self.assertTrue(db_router.has_recent_write("u1"))
+
+            self.client.get("/api/expenses/")
+            self.assertEqual(use_replica.call_count, 1)
+
+            # Other users are unaffected
+            api_client("u2").get("/api/expenses/")
+            self.assertEqual(use_replica.call_count, 2)
+
+    def test_failed_write_does_not_stick(self):
+        self.client.post("/api/expenses/", {"amount": "not a number"}, format="json")
+
+        self.assertFalse(db_router.has_recent_write("u1"))
+
+
+class BackfillTests(TestCase):
+    """backfill_uncategorized counts only written rows and checkpoints before failed AI calls."""
+
+    def setUp(self):
+        clear_caches()
+        self.expenses = [
+            Expense.objects.create(user_id="u1", amount=Decimal("10"), date=date(2024, 5, 1), description=text)
+            for text in ("coffee", "broken", "taxi")
+        ]
+
+    def fake_ai(self, description, amount):
+        if description == "broken":
+            raise RuntimeError("AI unavailable")
+        return {"coffee": "Food", "taxi": "Travel"}[description]
+
+    def test_failed_ai_call_holds_the_checkpoint(self):
+        checkpoints = []
+        with mock.patch.object(categorize, "suggest_with_ai", side_effect=self.fake_ai):
+            stats = categorize.backfill_uncategorized(
+                chunk_size=10, workers=1, on_chunk=lambda last_id, stats: checkpoints.append(last_id)
+            )
+
+        self.assertEqual((stats["updated"], stats["ai"], stats["failed"]), (2, 2, 1))
+        self.assertEqual(checkpoints, [self.expenses[1].id - 1])
+        self.assertIsNone(Expense.objects.get(id=self.expenses[1].id).category_id)
+
+        # A rerun from the checkpoint only sees the row that failed
+        with mock.patch.object(categorize, "suggest_with_ai", return_value="Bills"):
+            stats = categorize.backfill_uncategorized(start_after=checkpoints[-1], workers=1)
+        self.assertEqual((stats["scanned"], stats["updated"], stats["failed"]), (1, 1, 0))
+
+    def test_rows_categorized_meanwhile_are_not_counted(self):
+        get_category = lookups.get_category
+
+        def categorize_first(user_id, name):
+            # The user picks a category after the chunk was read
+            if not Expense.objects.filter(id=self.expenses[0].id, category__isnull=False).exists():
+                snacks = Category.objects.create(user_id="u1", name="Snacks")
+                Expense.objects.filter(id=self.expenses[0].id).update(category=snacks)
+            return get_category(user_id, name)
+
+        answers = {"coffee": "Food", "broken": "Bills", "taxi": "Travel"}
+        with mock.patch.object(categorize, "suggest_with_ai", side_effect=lambda d, a: answers[d]), \
+                mock.patch.object(lookups, "get_category", side_effect=categorize_first):
+            stats = categorize.backfill_uncategorized(workers=1)
+
+        self.assertEqual((stats["updated"], stats["ai"]), (2, 2))
+        self.assertEqual(Expense.objects.get(id=self.expenses[0].id).category.name, "Snacks")
+
+
+class RuleMatchingTests(TestCase):
+    """CategoryRules: priority order, amount bounds, edits, and bounded regex matching."""
+
+    def setUp(self):
+        clear_caches()
+        self.client = api_client("u1")
+        self.food = Category.objects.create(user_id="u1", name="Food")
+        self.travel = Category.objects.create(user_id="u1", name="Travel")
+
+    def add_rule(self, kind, pattern, category, priority=0, **bounds):
+        return CategoryRule.objects.create(
+            user_id="u1", kind=kind, pattern=pattern, category=category, priority=priority, **bounds
+        )
+
+    def test_first_matching_rule_wins(self):
+        self.add_rule("keyword", "uber", self.travel, priority=2)
+        self.add_rule("regex", r"uber\s+eats", self.food, priority=1)
+        self.add_rule("amount", "", self.food, priority=3, min_amount=Decimal("1000"))
+
+        self.assertEqual(rules.match_category("u1", "Uber Eats order", Decimal("20")), "Food")
+        self.assertEqual(rules.match_category("u1", "Uber to airport", Decimal("20")), "Travel")
+        self.assertEqual(rules.match_category("u1", "Rent", Decimal("1500")), "Food")
+        self.assertIsNone(rules.match_category("u1", "Rent", Decimal("500")))
+
+    def test_amount_bounds_apply_to_regex_rules(self):
+        self.add_rule("regex", "^cafe", self.food, max_amount=Decimal("50"))
+
+        self.assertEqual(rules.match_category("u1", "cafe latte", Decimal("4")), "Food")
+        self.assertIsNone(rules.match_category("u1", "cafe catering", Decimal("400")))
+
+    def test_edits_apply_to_cached_matcher(self):
+        rule = self.add_rule("keyword", "uber", self.travel)
+        self.assertEqual(rules.match_category("u1", "uber"), "Travel")
+
+        rule.category = self.food
+        rule.save()
+
+        self.assertEqual(rules.match_category("u1", "uber"), "Food")
+
+    def test_nested_quantifiers_are_rejected(self):
+        response = self.client.post(
+            "/api/rules/", {"kind": "regex", "pattern": "(a+)+$", "category": self.food.id}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("pattern", response.json())
+
+    def test_backtracking_patterns_stay_fast(self):
+        for pattern in (r"(a|a)*b", r"(a|aa)*c", r"a*a*a*a*a*c"):
+            with self.subTest(pattern=pattern):
+                rules.check_regex(pattern)
+                matcher = rules.RuleMatcher([("regex", pattern, None, None, "Food")])
+
+                started = time.monotonic()
+                self.assertIsNone(matcher.match("a" * rules.MAX_MATCH_LENGTH))
+                self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_slow_pattern_is_cut_off(self):
+        with mock.patch.object(rules, "check_regex"):
+            matcher = rules.RuleMatcher([
+                ("regex", r"(.*a){25}x", None, None, "Food"),
+                ("keyword", "b", None, None, "Travel"),
+            ])
+
+        started = time.monotonic()
+        self.assertIsNone(matcher.match("a" * 100 + "c" * 400))
+        self.assertLess(time.monotonic() - started, rules.MATCH_TIMEOUT + 0.5)
+        # Lower-priority keyword rules still apply
+        self.assertEqual(matcher.match("a" * 100 + "b" * 400), "Travel")
+
+
+class MonthStartTests(TestCase):
+    """Custom month start days: period boundaries, summaries and budget counters."""
+
+    def setUp(self):
+        clear_caches()
+        self.client = api_client("u1")
+        self.food = Category.objects.create(user_id="u1", name="Food")
+
+    def counter_periods(self):
+        return list(CategorySpend.objects.filter(user_id="u1").order_by("period_start").values_list("period_start", "total"))
+
+    def test_custom_month_range(self):
+        self.assertEqual(get_custom_month_range(date(2024, 5, 14), 15), (date(2024, 4, 15), date(2024, 5, 14)))
+        self.assertEqual(get_custom_month_range(date(2024, 5, 15), 15), (date(2024, 5, 15), date(2024, 6, 14)))
+        self.assertEqual(get_custom_month_range(date(2024, 1, 10), 15), (date(2023, 12, 15), date(2024, 1, 14)))
+        # Start days past 28 are clamped so every month has one
+        self.assertEqual(get_custom_month_range(date(2024, 3, 1), 31), (date(2024, 2, 28), date(2024, 3, 27)))
+
+    def test_summary_follows_saved_start_day(self):
+        userSetting.objects.create(user_id="u1", month_start_date=15)
+        for day, amount in ((date(2024, 5, 14), "10.00"), (date(2024, 5, 15), "20.00"), (date(2024, 6, 14), "5.00")):
+            Expense.objects.create(user_id="u1", amount=Decimal(amount), date=day, category=self.food)
+
+        summary = self.client.get("/api/expenses/summary/?date=2024-05-20").json()
+
+        self.assertEqual((summary["start"], summary["end"]), ("2024-05-15", "2024-06-14"))
+        self.assertEqual(summary["total"], 25.0)
+
+    def test_start_day_change_rebuckets_counters(self):
+        Expense.objects.create(user_id="u1", amount=Decimal("10.00"), date=date(2024, 5, 10), category=self.food)
+        self.assertEqual(self.counter_periods(), [(date(2024, 5, 1), Decimal("10.00"))])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/settings/", {"month_start_date": 15}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.counter_periods(), [(date(2024, 4, 15), Decimal("10.00"))])
+
+        # Later writes use the new start day, not a cached one
+        Expense.objects.create(user_id="u1", amount=Decimal("4.00"), date=date(2024, 5, 20), category=self.food)
+        self.assertEqual(self.counter_periods(), [
+            (date(2024, 4, 15), Decimal("10.00")), (date(2024, 5, 15), Decimal("4.00")),
+        ])
+
+
+class RecurringMaterializationTests(TestCase):
+    """materialize_recurring creates each occurrence once, however often it runs."""
+
+    def setUp(self):
+        clear_caches()
+        self.food = Category.objects.create(user_id="u1", name="Food")
+
+    def add_template(self, **fields):
+        fields.setdefault("next_date", fields["start_date"])
+        return RecurringExpense.objects.create(user_id="u1", amount=Decimal("10.00"), category=self.food, **fields)
+
+    def test_reruns_create_nothing_new(self):
+        template = self.add_template(frequency="daily", start_date=date(2024, 5, 1))
+
+        self.assertEqual(materialize_recurring(until=date(2024, 5, 5)), (1, 5))
+        self.assertEqual(materialize_recurring(until=date(2024, 5, 5)), (0, 0))
+
+        template.refresh_from_db()
+        self.assertEqual(template.next_date, date(2024, 5, 6))
+        self.assertEqual(Expense.objects.filter(recurring=template).count(), 5)
+        self.assertEqual(CategorySpend.objects.get(period_start=date(2024, 5, 1)).total, Decimal("50.00"))
+
+        # Picks up where the last run stopped
+        self.assertEqual(materialize_recurring(until=date(2024, 5, 7)), (1, 2))
+        self.assertEqual(Expense.objects.filter(recurring=template).count(), 7)
+
+    def test_monthly_end_date_and_anchor_day(self):
+        template = self.add_template(frequency="monthly", start_date=date(2024, 1, 31), end_date=date(2024, 4, 15))
+
+        materialize_recurring(until=date(2024, 12, 31))
+
+        days = list(Expense.objects.filter(recurring=template).order_by("date").values_list("date", flat=True))
+        self.assertEqual(days, [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31)])
+        template.refresh_from_db()
+        self.assertFalse(template.active)
+
+
+@override_settings(SYNC_LAG_SECONDS=0)
+class DeltaSyncTests(TestCase):
+    """/api/sync/: upserts and tombstones after a cursor, and the lag that holds back fresh writes."""
+
+    def setUp(self):
+        clear_caches()
+        self.client = api_client("u1")
+        self.food = Category.objects.create(user_id="u1", name="Food")
+
+    def sync(self, cursor=None):
+        response = self.client.get("/api/sync/", {"since": cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def add_expense(self, amount="10.00"):
+        return Expense.objects.create(user_id="u1", amount=Decimal(amount), date=date(2024, 5, 1), category=self.food)
+
+    def test_changes_and_deletes_since_cursor(self):
+        kept = self.add_expense()
+        removed = self.add_expense("20.00")
+        first = self.sync()
+        self.assertEqual({e["id"] for e in first["expenses"]}, {kept.id, removed.id})
+        self.assertEqual(first["deleted"], {"expenses": [], "categories": [], "tags": []})
+
+        kept.amount = Decimal("12.00")
+        kept.save()
+        removed_id = removed.id
+        removed.delete()
+        Expense.objects.create(user_id="u2", amount=Decimal("1.00"), date=date(2024, 5, 1))
+
+        second = self.sync(first["cursor"])
+        self.assertEqual([e["id"] for e in second["expenses"]], [kept.id])
+        self.assertEqual(second["deleted"]["expenses"], [removed_id])
+        self.assertEqual(second["categories"], [])
+
+        third = self.sync(second["cursor"])
+        self.assertEqual((third["expenses"], third["deleted"]["expenses"]), ([], []))
+
+    def test_category_delete_touches_its_expenses(self):
+        expense = self.add_expense()
+        cursor = self.sync()["cursor"]
+        food_id = self.food.id
+
+        self.food.delete()
+
+        changes = self.sync(cursor)
+        self.assertEqual(changes["deleted"]["categories"], [food_id])
+        self.assertEqual([(e["id"], e["category"]) for e in changes["expenses"]], [(expense.id, None)])
+
+    def test_pages_until_has_more_is_false(self):
+        ids = {self.add_expense().id for _ in range(5)}
+        seen = set()
+        cursor = None
+        for _ in range(10):
+            response = self.client.get("/api/sync/", {"limit": 2, **({"since": cursor} if cursor else {})}).json()
+            seen.update(e["id"] for e in response["expenses"])
+            cursor = response["cursor"]
+            if not response["has_more"]:
+                break
+        self.assertEqual(seen, ids)
+
+    @override_settings(SYNC_LAG_SECONDS=2)
+    def test_recent_writes_wait_for_the_next_cursor(self):
+        expense = self.add_expense()
+
+        cursor, _, changes = get_sync_changes("u1")
+        self.assertFalse(changes["expenses"].exists())
+        self.assertLess(cursor, expense.updated_at)
+
+        _, _, changes = get_sync_changes("u1", since=cursor, now=timezone.now() + timedelta(seconds=3))
+        self.assertEqual(list(changes["expenses"].values_list("id", flat=True)), [expense.id])
+
+    def test_bad_and_expired_cursors(self):
+        self.assertEqual(self.client.get("/api/sync/", {"since": "abc"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/sync/", {"since": "1"}).status_code, 410)
+
+
+class IdempotencyKeyTests(TestCase):
+    """Writes sent with an Idempotency-Key run once; retries get the stored response."""
+
+    def setUp(self):
+        clear_caches()
+        self.client = api_client("u1")
+        self.body = {"amount": "12.50", "date": "2024-05-02", "description": "lunch"}
+
+    def post(self, body, key="key-1"):
+        return self.client.post("/api/expenses/", body, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post(self.body)
+        retry = self.post(self.body)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.json()), (201, first.json()))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Expense.objects.count(), 1)
+
+    def test_replay_from_the_database_claim(self):
+        first = self.post(self.body)
+        # Another worker, or an evicted cache entry: only the IdempotencyKey row is left
+        cache.clear()
+
+        retry = self.post(self.body)
+
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Expense.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+
+    def test_same_key_with_another_body_is_rejected(self):
+        self.post(self.body)
+
+        response = self.post({**self.body, "amount": "99.00"})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Expense.objects.count(), 1)
+
+    def test_keys_are_per_user_and_failed_requests_release_them(self):
+        self.assertEqual(self.post({"amount": "oops"}).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(self.post(self.body).status_code, 201)
+        other = api_client("u2").post("/api/expenses/", self.body, format="json", HTTP_IDEMPOTENCY_KEY="key-1")
+        self.assertEqual(other.status_code, 201)
+        self.assertNotIn("Idempotent-Replayed", other)
+        self.assertEqual(Expense.objects.count(), 2)
+
+
+@override_settings(AI_RATE_LIMITS={
+    "insights": {"capacity": 2, "refill_per_minute": 60, "daily_quota": 3},
+})
+class AIRateLimitTests(TestCase):
+    """Per-user token buckets and daily quotas for AI calls."""
+
+    def setUp(self):
+        clear_caches()
+
+    def test_bucket_empties_and_refills(self):
+        with mock.patch.object(ratelimit.time, "time", return_value=1000.0) as clock:
+            self.assertTrue(ratelimit.allow_ai_call("u1", "insights"))
+            self.assertTrue(ratelimit.allow_ai_call("u1", "insights"))
+            self.assertFalse(ratelimit.allow_ai_call("u1", "insights"))
+            # Buckets are per user
+            self.assertTrue(ratelimit.allow_ai_call("u2", "insights"))
+
+            clock.return_value = 1001.0
+            self.assertTrue(ratelimit.allow_ai_call("u1", "insights"))
+
+    def test_daily_quota(self):
+        with mock.patch.object(ratelimit.time, "time", return_value=1000.0) as clock:
+            for _ in range(3):
+                clock.return_value += 60
+                self.assertTrue(ratelimit.allow_ai_call("u1", "insights"))
+            clock.return_value += 60
+            self.assertFalse(ratelimit.allow_ai_call("u1", "insights"))
+
+    def test_anonymous_calls_are_refused(self):
+        self.assertFalse(ratelimit.allow_ai_call(None, "insights"))
+
+
+class AISingleFlightTests(TestCase):
+    """Identical concurrent AI calls share one request to the model."""
+
+    def setUp(self):
+        clear_caches()
+
+    def test_concurrent_callers_share_one_call(self):
+        calls = []
+        started = threading.Event()
+
+        def slow_call():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return "insight"
+
+        results = []
+        def run():
+            results.append(ai_client._single_flight("prompt", slow_call))
+
+        leader = threading.Thread(target=run)
+        leader.start()
+        started.wait(1)
+        followers = [threading.Thread(target=run) for _ in range(4)]
+        for thread in followers:
+            thread.start()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["insight"] * 5)
+
+    def test_result_is_shared_through_the_cache(self):
+        # Another worker finished the same call a moment ago
+        ai_client._single_flight("prompt", lambda: "from another worker")
+
+        self.assertEqual(ai_client._single_flight("prompt", mock.Mock(side_effect=AssertionError)), "from another worker")
+
+    def test_errors_reach_waiting_callers(self):
+        started = threading.Event()
+        errors = []
+
+        def failing_call():
+            started.set()
+            time.sleep(0.1)
+            raise RuntimeError("quota exceeded")
+
+        def run():
+            try:
+                ai_client._single_flight("failing", failing_call)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=run)]
+        threads[0].start()
+        started.wait(1)
+        threads.append(threading.Thread(target=run))
+        threads[1].start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(errors, ["quota exceeded"] * 2)
+        self.assertIsNone(cache.get("ai-result:failing"))
@@ -1,24 +1,75 @@
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.viewsets import ModelViewSet, ViewSet
 from rest_framework import permissions
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from datetime import date
+from rest_framework.exceptions import ValidationError
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+from datetime import date, timedelta
+from functools import partial
 
-from .models import Category, Tag, Expense, userSetting
+from tracker import db_router
+
+from .models import Category, Tag, Expense, ArchivedExpense, RecurringExpense, Budget, CategoryRule, userSetting
 from .serializers import (
     CategorySerializer,
     TagSerializer,
     ExpenseSerializer,
+    RecurringExpenseSerializer,
+    BudgetSerializer,
+    CategoryRuleSerializer,
     UserSettingSerializer,
+    serialize_expense_values,
+)
+from . import lookups, ratelimit, categorize, idempotency
+from .ai.usage import attribute_usage
+from .services import (
+    get_date_range,
+    get_period_summary,
+    get_archive_watermark,
+    reaches_archive,
+    get_tag_summary,
+    get_anomalies,
+    get_spend_forecast,
+    build_fallback_insight,
+    get_insight_data,
+    get_insight_fingerprint,
+    get_stored_insight,
+    store_insight,
+    generate_insight_text,
+    get_period_start,
+    get_budget_status,
+    encode_sync_cursor,
+    decode_sync_cursor,
+    get_sync_changes,
 )
-from .ai.client import suggest_category, generate_insights
-from .services import get_date_range, get_expense_summary
 
 # ---- BASE VIEWSET ----
 class BaseClerkViewSet(ModelViewSet):
     """Base ViewSet that handles Clerk user ID retrieval"""
     permission_classes = [IsAuthenticated]
+    # Read-only actions that may be served from the read replica
+    replica_actions = ()
+    _replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        clerk_id = self.get_clerk_id()
+        if self.action in self.replica_actions and clerk_id and not db_router.has_recent_write(clerk_id):
+            self._replica_token = db_router.use_replica()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._replica_token is not None:
+            db_router.release_replica(self._replica_token)
+            self._replica_token = None
+        elif request.method not in permissions.SAFE_METHODS and response.status_code < 400:
+            clerk_id = self.get_clerk_id()
+            if clerk_id:
+                db_router.mark_recent_write(clerk_id)
+        return super().finalize_response(request, response, *args, **kwargs)
 
     def get_clerk_id(self):
         # 1. Try standard DRF authenticated user (set by ClerkAuthentication)
@@ -62,13 +113,18 @@ class TagViewSet(BaseClerkViewSet):
 class ExpenseViewSet(BaseClerkViewSet):
     queryset = Expense.objects.all()
     serializer_class = ExpenseSerializer
+    replica_actions = ("list", "summary", "insights", "tag_summary", "forecast", "dashboard")
 
     def get_queryset(self):
         clerk_id = self.get_clerk_id()
         if not clerk_id:
             return Expense.objects.none()
             
-        queryset = Expense.objects.filter(user_id=clerk_id)
+        queryset = self._filter_expenses(Expense.objects.filter(user_id=clerk_id))
+        return queryset.order_by('-date', '-created_at')
+
+    def _filter_expenses(self, queryset):
+        # Same list filters for live and archived expenses
 
         # GET parameters for filtering
         start = self.request.query_params.get("start")
@@ -76,6 +132,7 @@ class ExpenseViewSet(BaseClerkViewSet):
         category = self.request.query_params.get("category")
         tag = self.request.query_params.get("tag")
         search = self.request.query_params.get("search")
+        anomaly = self.request.query_params.get("anomaly")
 
         if start:
             queryset = queryset.filter(date__gte=start)
@@ -87,90 +144,153 @@ class ExpenseViewSet(BaseClerkViewSet):
             queryset = queryset.filter(tag__id=tag)
         if search:
             queryset = queryset.filter(description__icontains=search)
+        if anomaly in ("true", "1"):
+            queryset = queryset.filter(is_anomaly=True)
 
-        return queryset.order_by('-date', '-created_at')
+        return queryset
+
+    def _archive_queryset(self):
+        # Archived rows matching the list filters, or None when the requested range
+        # doesn't reach back into the user's archive
+        clerk_id = self.get_clerk_id()
+        watermark = get_archive_watermark(clerk_id) if clerk_id else None
+        if watermark is None:
+            return None
+
+        start = self.request.query_params.get("start")
+        if start:
+            try:
+                if date.fromisoformat(start) > watermark:
+                    return None
+            except ValueError:
+                pass
+
+        return self._filter_expenses(ArchivedExpense.objects.filter(user_id=clerk_id))
+
+    def _requested_fields(self):
+        # ?fields=id,amount,date -> sparse fieldset; None means all fields
+        fields = self.request.query_params.get("fields")
+        if not fields:
+            return None
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(fields) - set(ExpenseSerializer.Meta.fields)
+        if unknown:
+            raise ValidationError({"fields": f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == "GET":
+            kwargs.setdefault("fields", self._requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        if self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(serialize_expense_values(
+            queryset, self._requested_fields(), archive_queryset=self._archive_queryset()
+        ))
+
+    # Retried writes carrying the same Idempotency-Key get the first response back
+    # instead of creating a duplicate row (and a second Gemini call)
+    def create(self, request, *args, **kwargs):
+        run = partial(super().create, request, *args, **kwargs)
+        return idempotency.replay_or_run(request, self.get_clerk_id(), run)
+
+    def update(self, request, *args, **kwargs):
+        run = partial(super().update, request, *args, **kwargs)
+        return idempotency.replay_or_run(request, self.get_clerk_id(), run)
+
+    def _suggest_category_name(self, clerk_id, description, amount):
+        # Auto-categorization (user rules, cache, history, then AI), run before the write so
+        # the expense is inserted once. Over the user's AI limit it is saved uncategorized.
+        rule_category = categorize.match_category(clerk_id, description, amount)
+        if rule_category or not description:
+            return rule_category
+
+        local = categorize.resolve_local(clerk_id, [description])
+        if description in local:
+            return local[description]
+
+        if not ratelimit.allow_ai_call(clerk_id, "categorize"):
+            print(f"AI categorization rate limited for {clerk_id}")
+            return None
+        try:
+            with attribute_usage(clerk_id, "categorize"):
+                return categorize.suggest_with_ai(description, amount)
+        except Exception as e:
+            print(f"AI Auto-categorization failed: {e}")
+        return None
+
+    def _save_expense(self, serializer, clerk_id, category_name, **kwargs):
+        """
+        Resolves category/tag names through the per-user lookup cache and saves
+        the expense (row + M2M) in one transaction.
+        """
+        tag_names = self.request.data.get('tag_names')
+        # post_save moves the budget snapshot to the new values even if the transaction
+        # then rolls back, so a retry has to start from the original one
+        instance = serializer.instance
+        loaded_spend = getattr(instance, "_loaded_spend", None)
+
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    if category_name and category_name.strip():
+                        kwargs["category"] = lookups.get_category(clerk_id, category_name)
+                    if isinstance(tag_names, list):
+                        kwargs["tag"] = lookups.get_tag_ids(clerk_id, tag_names)
+                    return serializer.save(**kwargs)
+            except IntegrityError:
+                # Another worker may have deleted a category/tag we still had cached
+                if attempt:
+                    raise
+                lookups.invalidate_categories(clerk_id)
+                lookups.invalidate_tags(clerk_id)
+                if loaded_spend is not None:
+                    instance._loaded_spend = loaded_spend
 
     def perform_create(self, serializer):
         clerk_id = self.get_clerk_id()
         if not clerk_id:
             from rest_framework.exceptions import NotAuthenticated
             raise NotAuthenticated("User identification failed.")
-    
-        # Save the expense
-        expense = serializer.save(user_id=clerk_id)
 
-        #Handle manual category assignment
+        data = serializer.validated_data
+
+        # Manual category assignment wins over AI
         category_name = self.request.data.get('category_name')
-        if category_name and category_name.strip():
-            category, _ = Category.objects.get_or_create(
-                user_id=clerk_id,
-                name=category_name.strip()
-            )
-            expense.category = category
-            expense.category_name = category.name
-            expense.save(update_fields=["category"]) # Not strictly needed if we save again, but good for clarity of intent
-
-        # AI Auto-categorization
-        elif expense.description and not expense.category:
-            try:
-                suggestion = suggest_category(
-                    description=expense.description,
-                    amount=float(expense.amount),
-                    model_name="gemini-2.5-flash"
-                )
+        if not (category_name and category_name.strip()):
+            category_name = None
+            if not data.get('category'):
+                category_name = self._suggest_category_name(clerk_id, data.get('description'), data['amount'])
 
-                if suggestion and isinstance(suggestion, dict):
-                    cat_name = suggestion.get("category")
-                    if cat_name:
-                        category_obj, _ = Category.objects.get_or_create(
-                            user_id=clerk_id,
-                            name=cat_name.strip()
-                        )
-                        expense.category = category_obj
-                        # expense.category_name = category_obj.name # Computed field / not on model usually, but harmless
-                        expense.save(update_fields=["category"])
-            except Exception as e:
-                print(f"AI Auto-categorization failed: {e}")
+        self._save_expense(serializer, clerk_id, category_name, user_id=clerk_id)
 
     def perform_update(self, serializer):
         clerk_id = self.get_clerk_id()
-        expense = serializer.save()
-        
-        # Handle manual category assignment
+        data = serializer.validated_data
+        instance = serializer.instance
+
         category_name = self.request.data.get('category_name')
-        if category_name and category_name.strip():
-            category, _ = Category.objects.get_or_create(
-                user_id=clerk_id,
-                name=category_name.strip()
-            )
-            expense.category = category
-            expense.save(update_fields=["category"])
-        
-        elif expense.description and not expense.category:
-            # AI Suggestion if no manual category and no existing category
-            try:
-                suggestion = suggest_category(
-                    description=expense.description,
-                    amount=float(expense.amount),
+        if not (category_name and category_name.strip()):
+            category_name = None
+            description = data.get('description', instance.description)
+            has_category = data['category'] if 'category' in data else instance.category_id
+            if not has_category:
+                # Suggestion if no manual category and no existing category
+                category_name = self._suggest_category_name(
+                    clerk_id, description, data.get('amount', instance.amount)
                 )
-                if suggestion:
-                    cat_name = suggestion.get("category")
-                    if cat_name:
-                        category, _ = Category.objects.get_or_create(
-                            user_id=clerk_id,
-                            name=cat_name.strip()
-                        )
-                        expense.category = category
-                        expense.save(update_fields=["category"])
-            except Exception as e:
-                print(f"AI Update categorization failed: {e}")
 
-    @action(detail=False, methods=["get"])
-    def summary(self, request):
-        clerk_id = self.get_clerk_id()
-        if not clerk_id:
-            return Response({"error": "No user found"}, status=401)
-        
+        self._save_expense(serializer, clerk_id, category_name)
+
+    def _resolve_period(self, request, clerk_id):
+        """
+        Reads period/date/start/end query params and resolves them to a range.
+        Returns (period, (start, end, prev_start, prev_end), explicit) or (period, None, False)
+        on a bad date; `explicit` is True when the range came from valid start/end params.
+        """
         period = request.query_params.get("period", "monthly")
         today_str = request.query_params.get("date")
         start_param = request.query_params.get("start")
@@ -180,19 +300,35 @@ class ExpenseViewSet(BaseClerkViewSet):
             try:
                 ref_date = date.fromisoformat(today_str)
             except ValueError:
-                return Response({"detail": "Invalid date format."}, status=400)
+                return period, None, False
         else:
             ref_date = date.today()
 
-        # Use Service to get range
-        start, end, _, _ = get_date_range(clerk_id, period, ref_date, start_param, end_param)
+        explicit = False
+        if start_param and end_param:
+            try:
+                date.fromisoformat(start_param)
+                date.fromisoformat(end_param)
+                explicit = True
+            except ValueError:
+                # get_date_range falls back to the period
+                pass
+
+        return period, get_date_range(clerk_id, period, ref_date, start_param, end_param), explicit
 
-        qs = Expense.objects.filter(user_id=clerk_id)
-        if start and end:
-            qs = qs.filter(date__gte=start, date__lte=end)
+    @action(detail=False, methods=["get"])
+    def summary(self, request):
+        clerk_id = self.get_clerk_id()
+        if not clerk_id:
+            return Response({"error": "No user found"}, status=401)
         
-        # Use Service to get summary
-        total, count, by_category = get_expense_summary(qs)
+        period, date_range, _ = self._resolve_period(request, clerk_id)
+        if date_range is None:
+            return Response({"detail": "Invalid date format."}, status=400)
+        start, end, _, _ = date_range
+
+        # Use Service to get summary (includes archived expenses)
+        total, count, by_category = get_period_summary(clerk_id, start, end)
 
         return Response({
             "period": period, 
@@ -204,76 +340,122 @@ class ExpenseViewSet(BaseClerkViewSet):
         })
 
     @action(detail=False, methods=["get"])
-    def insights(self, request):
+    def forecast(self, request):
         clerk_id = self.get_clerk_id()
         if not clerk_id:
             return Response({"error": "No user found"}, status=401)
-        
-        period = request.query_params.get("period", "monthly")
+
+        period, date_range, explicit = self._resolve_period(request, clerk_id)
+        if date_range is None:
+            return Response({"detail": "Invalid date format."}, status=400)
+        start, end, _, _ = date_range
+        if not (start and end):
+            return Response({"detail": "Forecast needs a bounded period."}, status=400)
+
+        try:
+            history = min(max(int(request.query_params.get("history", 6)), 0), 24)
+        except ValueError:
+            return Response({"detail": "Invalid history."}, status=400)
+
         today_str = request.query_params.get("date")
-        start_param = request.query_params.get("start")
-        end_param = request.query_params.get("end")
+        today = date.fromisoformat(today_str) if today_str else date.today()
 
-        if today_str:
-            try:
-                ref_date = date.fromisoformat(today_str)
-            except ValueError:
-                return Response({"detail": "Invalid date format."}, status=400)
-        else:
-            ref_date = date.today()
+        # An explicit start/end is compared with past windows of the same length,
+        # not with calendar months
+        history_period = "custom" if explicit else period
+        forecast = get_spend_forecast(clerk_id, start, end, today, history_period, history)
+
+        return Response({
+            "period": period,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            **forecast,
+        })
+
+    @action(detail=False, methods=["get"], url_path="tag-summary")
+    def tag_summary(self, request):
+        clerk_id = self.get_clerk_id()
+        if not clerk_id:
+            return Response({"error": "No user found"}, status=401)
 
-        # Use Service to get range
-        start, end, prev_start, prev_end = get_date_range(clerk_id, period, ref_date, start_param, end_param)
+        period, date_range, _ = self._resolve_period(request, clerk_id)
+        if date_range is None:
+            return Response({"detail": "Invalid date format."}, status=400)
+        start, end, _, _ = date_range
 
         qs = Expense.objects.filter(user_id=clerk_id)
-        
-        # Current Period Data
-        qs_current = qs
+        archived = ArchivedExpense.objects.filter(user_id=clerk_id) if reaches_archive(clerk_id, start) else None
         if start and end:
-            qs_current = qs.filter(date__gte=start, date__lte=end)
+            qs = qs.filter(date__gte=start, date__lte=end)
+            if archived is not None:
+                archived = archived.filter(date__gte=start, date__lte=end)
+
+        by_tag, by_tag_category = get_tag_summary(qs, archive_queryset=archived)
+
+        return Response({
+            "period": period,
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None,
+            "by_tag": by_tag,
+            "by_tag_category": by_tag_category,
+        })
+
+    def _resolve_insight(self, clerk_id, summary_data, prev_total, defer=False):
+        """
+        Returns (insight_text, source) for a non-empty summary: the precomputed insight while
+        the data is unchanged, else a fresh AI one (rate limited per user), degrading to the
+        last AI insight or a local one. With `defer` no AI call is made; without a stored or
+        cached insight this returns (None, "pending").
+        """
+        fingerprint = get_insight_fingerprint(summary_data, prev_total)
+        insight_text = get_stored_insight(clerk_id, summary_data, fingerprint)
+        if insight_text:
+            return insight_text, "precomputed"
+
+        last_insight_key = (
+            f"insight:last:{clerk_id}:{summary_data['period']}:{summary_data['start']}:{summary_data['end']}"
+        )
+        if defer:
+            insight_text = cache.get(last_insight_key)
+            return (insight_text, "cache") if insight_text else (None, "pending")
+
+        if ratelimit.allow_ai_call(clerk_id, "insights"):
+            with attribute_usage(clerk_id, "insights"):
+                insight_text = generate_insight_text(summary_data, prev_total)
+            if insight_text:
+                cache.set(last_insight_key, insight_text, 60 * 60 * 24)
+                store_insight(clerk_id, summary_data, fingerprint, insight_text)
+                return insight_text, "ai"
+        else:
+            insight_text = cache.get(last_insight_key)
+            if insight_text:
+                return insight_text, "cache"
+
+        return build_fallback_insight(summary_data, previous_total=prev_total), "fallback"
+
+    @action(detail=False, methods=["get"])
+    def insights(self, request):
+        clerk_id = self.get_clerk_id()
+        if not clerk_id:
+            return Response({"error": "No user found"}, status=401)
         
-        total, count, by_category = get_expense_summary(qs_current)
+        period, date_range, _ = self._resolve_period(request, clerk_id)
+        if date_range is None:
+            return Response({"detail": "Invalid date format."}, status=400)
+        start, end, prev_start, prev_end = date_range
+
+        summary_data, prev_total = get_insight_data(clerk_id, period, start, end, prev_start, prev_end)
+        total = summary_data["total"]
+        by_category = summary_data["by_category"]
 
         if total == 0:
              return Response({
-                "summary": {
-                    "period": period, 
-                    "start": start.isoformat() if start else None, 
-                    "end": end.isoformat() if end else None, 
-                    "total": 0, 
-                    "count": 0,
-                    "by_category": []
-                },
+                "summary": summary_data,
                 "cards": {"total_spent": 0, "top_category": None},
                 "insight": "No expenses found for this period. Start adding transactions to see AI insights!",
             })
 
-        # Previous Period Data (for comparison)
-        prev_total = 0
-        if prev_start and prev_end:
-            prev_qs = qs.filter(date__gte=prev_start, date__lte=prev_end)
-            prev_total, _, _ = get_expense_summary(prev_qs)
-
-        # Prepare Summary Dict for AI
-        summary_data = {
-            "period": period, 
-            "start": start.isoformat() if start else None, 
-            "end": end.isoformat() if end else None, 
-            "total": total, 
-            "count": count,
-            "by_category": by_category
-        }
-
-        # Generate Insights
-        insight_text = "Analysis currently unavailable."
-        try:
-            insight = generate_insights(summary_data, previous_total=prev_total)
-            if isinstance(insight, dict) and "text" in insight:
-                insight_text = insight["text"]
-            elif isinstance(insight, str):
-                insight_text = insight
-        except Exception as e:
-            print(f"AI Error: {e}")
+        insight_text, insight_source = self._resolve_insight(clerk_id, summary_data, prev_total)
 
         return Response({
             "summary": summary_data,
@@ -282,6 +464,219 @@ class ExpenseViewSet(BaseClerkViewSet):
                 "top_category": by_category[0]["name"] if by_category else None
             },
             "insight": insight_text,
+            "insight_source": insight_source,
+        })
+
+    @action(detail=False, methods=["get"])
+    def dashboard(self, request):
+        """
+        Everything the dashboard shows in one response (also routed as /api/dashboard/):
+        summary cards, category breakdown, recent expenses, categories, tags and the insight.
+        Takes the same period params as summary, plus `recent` (default 10) and
+        `defer_insight=1` to skip the AI call; the client then fetches insights/ if the
+        insight status is "pending".
+        """
+        clerk_id = self.get_clerk_id()
+        if not clerk_id:
+            return Response({"error": "No user found"}, status=401)
+
+        period, date_range, _ = self._resolve_period(request, clerk_id)
+        if date_range is None:
+            return Response({"detail": "Invalid date format."}, status=400)
+        start, end, prev_start, prev_end = date_range
+
+        try:
+            recent_count = min(max(int(request.query_params.get("recent", 10)), 0), 50)
+        except ValueError:
+            return Response({"detail": "Invalid recent count."}, status=400)
+        defer = request.query_params.get("defer_insight") in ("1", "true")
+
+        # One summary pass feeds the cards, the breakdown and the insight
+        summary_data, prev_total = get_insight_data(clerk_id, period, start, end, prev_start, prev_end)
+        by_category = summary_data["by_category"]
+
+        if summary_data["total"] == 0:
+            insight = {"status": "empty", "source": None, "text": None}
+        else:
+            insight_text, insight_source = self._resolve_insight(clerk_id, summary_data, prev_total, defer)
+            insight = {
+                "status": "pending" if insight_text is None else "ready",
+                "source": None if insight_text is None else insight_source,
+                "text": insight_text,
+            }
+
+        # Ids first: MySQL can't use a LIMIT subquery for the tag lookup
+        recent_ids = list(
+            Expense.objects.filter(user_id=clerk_id)
+            .order_by("-date", "-created_at")
+            .values_list("id", flat=True)[:recent_count]
+        )
+        recent = serialize_expense_values(
+            Expense.objects.filter(id__in=recent_ids).order_by("-date", "-created_at")
+        ) if recent_ids else []
+
+        return Response({
+            "period": period,
+            "start": summary_data["start"],
+            "end": summary_data["end"],
+            "cards": {
+                "total_spent": summary_data["total"],
+                "count": summary_data["count"],
+                "previous_total": prev_total,
+                "top_category": by_category[0]["name"] if by_category else None,
+            },
+            "by_category": by_category,
+            "anomalies": summary_data.get("anomalies", []),
+            "recent": recent,
+            "categories": CategorySerializer(Category.objects.filter(user_id=clerk_id), many=True).data,
+            "tags": TagSerializer(Tag.objects.filter(user_id=clerk_id), many=True).data,
+            "insight": insight,
+        })
+
+
+# ---- RECURRING EXPENSE ----
+class RecurringExpenseViewSet(BaseClerkViewSet):
+    queryset = RecurringExpense.objects.select_related("category").order_by("next_date")
+    serializer_class = RecurringExpenseSerializer
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["user_id"] = self.get_clerk_id()
+        return context
+
+    def _category_kwargs(self, clerk_id):
+        # Same manual category_name handling as expenses; templates never go through AI
+        category_name = self.request.data.get('category_name')
+        if category_name and category_name.strip():
+            return {"category": lookups.get_category(clerk_id, category_name)}
+        return {}
+
+    def perform_create(self, serializer):
+        clerk_id = self.get_clerk_id()
+        if not clerk_id:
+            from rest_framework.exceptions import NotAuthenticated
+            raise NotAuthenticated("User identification failed.")
+        serializer.save(user_id=clerk_id, **self._category_kwargs(clerk_id))
+
+    def perform_update(self, serializer):
+        clerk_id = self.get_clerk_id()
+        kwargs = self._category_kwargs(clerk_id)
+        instance = serializer.instance
+        start = serializer.validated_data.get("start_date")
+        if start and start != instance.start_date and start > instance.next_date:
+            # Moving the start forward skips occurrences that were not created yet
+            kwargs["next_date"] = start
+        serializer.save(**kwargs)
+
+
+# ---- BUDGET ----
+class BudgetViewSet(BaseClerkViewSet):
+    queryset = Budget.objects.select_related("category")
+    serializer_class = BudgetSerializer
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["user_id"] = self.get_clerk_id()
+        return context
+
+    def list(self, request, *args, **kwargs):
+        clerk_id = self.get_clerk_id()
+        today_str = request.query_params.get("date")
+        try:
+            ref_date = date.fromisoformat(today_str) if today_str else date.today()
+        except ValueError:
+            return Response({"detail": "Invalid date format."}, status=400)
+
+        budgets = list(self.get_queryset())
+        period_start = get_period_start(clerk_id, ref_date)
+        context = self.get_serializer_context()
+        context["budget_status"] = get_budget_status(clerk_id, budgets, period_start)
+
+        serializer = self.get_serializer_class()(budgets, many=True, context=context)
+        return Response({
+            "period_start": period_start.isoformat(),
+            "budgets": serializer.data,
+        })
+
+
+# ---- CATEGORY RULES ----
+class CategoryRuleViewSet(BaseClerkViewSet):
+    queryset = CategoryRule.objects.select_related("category").order_by("priority", "id")
+    serializer_class = CategoryRuleSerializer
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["user_id"] = self.get_clerk_id()
+        category_name = self.request.data.get('category_name') if self.request else None
+        context["has_category_name"] = bool(category_name and str(category_name).strip())
+        return context
+
+    def _category_kwargs(self, clerk_id):
+        category_name = self.request.data.get('category_name')
+        if category_name and category_name.strip():
+            return {"category": lookups.get_category(clerk_id, category_name)}
+        return {}
+
+    def perform_create(self, serializer):
+        clerk_id = self.get_clerk_id()
+        if not clerk_id:
+            from rest_framework.exceptions import NotAuthenticated
+            raise NotAuthenticated("User identification failed.")
+        serializer.save(user_id=clerk_id, **self._category_kwargs(clerk_id))
+
+    def perform_update(self, serializer):
+        serializer.save(**self._category_kwargs(self.get_clerk_id()))
+
+
+# ---- SYNC ----
+class SyncViewSet(ViewSet):
+    """
+    GET /api/sync/?since=<cursor> returns what changed since the cursor of an earlier
+    response: upserts for expenses, categories and tags plus ids deleted since then.
+    Without `since` it returns everything live (archived expenses stay on /api/expenses/).
+    Keep requesting with the new cursor while `has_more` is true.
+    """
+    permission_classes = [IsAuthenticated]
+    # Expenses reference categories by id; the name comes from the category list
+    expense_fields = [name for name in ExpenseSerializer.Meta.fields if name != "category_name"]
+
+    def list(self, request):
+        clerk_id = getattr(request.user, "id", None)
+        if not clerk_id:
+            return Response({"detail": "User identification failed."}, status=401)
+
+        since = request.query_params.get("since")
+        if since:
+            try:
+                since = decode_sync_cursor(since)
+            except (ValueError, OverflowError):
+                return Response({"detail": "Invalid cursor."}, status=400)
+            if since < timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS):
+                # Tombstones this old are pruned, so deletes could be missed
+                return Response({"detail": "Cursor expired; sync again without `since`."}, status=410)
+        else:
+            since = None
+
+        try:
+            limit = min(max(int(request.query_params.get("limit", 500)), 1), 1000)
+        except ValueError:
+            return Response({"detail": "Invalid limit."}, status=400)
+
+        watermark, has_more, changes = get_sync_changes(clerk_id, since, limit)
+
+        deleted = {"expenses": [], "categories": [], "tags": []}
+        if "deleted" in changes:
+            plural = {"expense": "expenses", "category": "categories", "tag": "tags"}
+            for model, object_id in changes["deleted"].values_list("model", "object_id"):
+                deleted[plural[model]].append(object_id)
+
+        return Response({
+            "cursor": encode_sync_cursor(watermark),
+            "has_more": has_more,
+            "expenses": serialize_expense_values(changes["expenses"], self.expense_fields),
+            "categories": CategorySerializer(changes["categories"], many=True).data,
+            "tags": TagSerializer(changes["tags"], many=True).data,
+            "deleted": deleted,
         })
 
 
@@ -0,0 +1,57 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+REPLICA_DB = "replica"
+
+# Set for the duration of a request whose reads may go to the replica
+_read_from_replica = ContextVar("read_from_replica", default=False)
+
+
+def replica_configured():
+    return REPLICA_DB in settings.DATABASES
+
+
+def use_replica():
+    """Route reads in the current context to the replica. Returns a token for release_replica()."""
+    return _read_from_replica.set(True)
+
+
+def release_replica(token):
+    _read_from_replica.reset(token)
+
+
+def _recent_write_key(user_id):
+    return f"db:recent-write:{user_id}"
+
+
+def mark_recent_write(user_id):
+    # Keep this user on the primary until the replica has caught up with the write
+    cache.set(_recent_write_key(user_id), 1, settings.REPLICA_STICKY_SECONDS)
+
+
+def has_recent_write(user_id):
+    return bool(cache.get(_recent_write_key(user_id)))
+
+
+class ReadReplicaRouter:
+    """
+    Sends all writes to the primary. Reads go to the replica only inside use_replica()
+    (read-only API actions) and only if a replica alias is configured.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and replica_configured():
+            return REPLICA_DB
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
@@ -1,5 +1,27 @@
 
-from django.http import HttpResponse
+import cProfile
+import hmac
+import json
+import pstats
+import re
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, JsonResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
 
 class ForceCorsMiddleware:
     def __init__(self, get_response):
@@ -17,6 +39,179 @@ class ForceCorsMiddleware:
         response["Access-Control-Allow-Origin"] = allow_origin
         response["Access-Control-Allow-Credentials"] = "true"
         response["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-        response["Access-Control-Allow-Headers"] = "Authorization, Content-Type, Accept, Origin, X-Requested-With, X-CSRFToken"
+        response["Access-Control-Allow-Headers"] = "Authorization, Content-Type, Accept, Origin, X-Requested-With, X-CSRFToken, Idempotency-Key"
         response["Access-Control-Max-Age"] = "600"
         return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresses responses larger than COMPRESSION_MIN_SIZE bytes.
+    Uses brotli when the client accepts it and the package is installed, gzip otherwise.
+    Strong ETags are weakened, as GZipMiddleware does, so conditional requests still match.
+    """
+
+    def process_response(self, request, response):
+        min_size = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+
+        if response.has_header("Content-Encoding"):
+            return response
+
+        ae = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if brotli is None or response.streaming or not re_accepts_brotli.search(ae):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        compressed_content = brotli.compress(
+            response.content, quality=getattr(settings, "BROTLI_QUALITY", 5)
+        )
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in per-request profiler. A request carrying an `X-Profile` header runs under
+    cProfile with every SQL statement recorded, when the header equals PROFILING_TOKEN
+    or the session user is staff; for anyone else the header is ignored.
+
+    Each profile is saved to PROFILING_DIR as <id>.prof (pstats format: snakeviz,
+    gprof2dot, `python -m pstats`) plus <id>.json with the top functions and the SQL
+    (timings, EXPLAIN plans, repeated statements flagged). The response gets X-Profile-*
+    summary headers; with `X-Profile-Report: inline` the JSON report replaces the body.
+    """
+
+    TOP_FUNCTIONS = 30
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if "HTTP_X_PROFILE" not in request.META or not self._allowed(request):
+            return self.get_response(request)
+
+        queries = []
+
+        def record_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append({
+                    "alias": context["connection"].alias,
+                    "sql": sql,
+                    "params": params,
+                    "many": many,
+                    "ms": (time.perf_counter() - started) * 1000,
+                })
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_query))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        report = self._build_report(request, response, profiler, queries, elapsed_ms)
+        self._save(report, profiler)
+
+        if request.headers.get("X-Profile-Report") == "inline":
+            response = JsonResponse(report, json_dumps_params={"default": str})
+        response["X-Profile-Id"] = report["id"]
+        response["X-Profile-Time-Ms"] = f"{elapsed_ms:.1f}"
+        response["X-Profile-Queries"] = str(len(queries))
+        response["X-Profile-Duplicate-Queries"] = str(report["duplicate_queries"])
+        return response
+
+    def _allowed(self, request):
+        token = getattr(settings, "PROFILING_TOKEN", "")
+        if token and hmac.compare_digest(request.headers.get("X-Profile", ""), token):
+            return True
+        user = getattr(request, "user", None)
+        return bool(user and getattr(user, "is_staff", False))
+
+    def _build_report(self, request, response, profiler, queries, elapsed_ms):
+        stats = pstats.Stats(profiler)
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        top = [
+            {
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "own_ms": round(own * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            }
+            for (filename, line, name), (_, calls, own, cumulative, _) in functions[: self.TOP_FUNCTIONS]
+        ]
+
+        # Same statement + params is a duplicate; same statement, other params is a likely N+1
+        seen, shapes = {}, {}
+        for query in queries:
+            key = (query["alias"], query["sql"], repr(query["params"]))
+            seen[key] = seen.get(key, 0) + 1
+            shapes[(query["alias"], query["sql"])] = shapes.get((query["alias"], query["sql"]), 0) + 1
+
+        explained = {}
+        for query in queries:
+            key = (query["alias"], query["sql"], repr(query["params"]))
+            query["duplicate"] = seen[key] > 1
+            query["similar"] = shapes[(query["alias"], query["sql"])]
+            if key not in explained:
+                explained[key] = self._explain(query)
+            query["explain"] = explained[key]
+            query["ms"] = round(query["ms"], 3)
+
+        profile_id = "{}-{}-{}".format(
+            time.strftime("%Y%m%d-%H%M%S"),
+            re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-") or "root",
+            uuid.uuid4().hex[:6],
+        )
+        return {
+            "id": profile_id,
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "total_ms": round(elapsed_ms, 3),
+            "sql_ms": round(sum(q["ms"] for q in queries), 3),
+            "query_count": len(queries),
+            "duplicate_queries": sum(count - 1 for count in seen.values()),
+            "top_functions": top,
+            "queries": queries,
+        }
+
+    def _explain(self, query):
+        # Only plain reads; EXPLAIN of a write may execute it on some backends
+        if query["many"] or not query["sql"].lstrip().upper().startswith("SELECT"):
+            return None
+        connection = connections[query["alias"]]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {query['sql']}", query["params"])
+                return [list(row) for row in cursor.fetchall()]
+        except Exception as e:
+            return f"EXPLAIN failed: {e}"
+
+    def _save(self, report, profiler):
+        directory = Path(getattr(settings, "PROFILING_DIR", "profiles"))
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(directory / f"{report['id']}.prof")
+            (directory / f"{report['id']}.json").write_text(json.dumps(report, indent=2, default=str))
+        except OSError as e:
+            print(f"Profiling: could not save {report['id']}: {e}")
@@ -0,0 +1,33 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to DRF's json.dumps renderer
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for DRF's JSONRenderer backed by orjson.
+
+    Types orjson doesn't handle the same way as DRF (Decimal, datetimes, ...) are passed
+    to DRF's own JSONEncoder, so the output matches JSONRenderer. Falls back to
+    JSONRenderer when orjson isn't installed or an indented response is requested.
+    """
+    options = (
+        (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+    )
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+
+        ret = orjson.dumps(data, default=self._encoder.default, option=self.options)
+
+        # Same escaping as JSONRenderer: U+2028/U+2029 are valid JSON but not valid JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -19,6 +19,7 @@ import os
 from dotenv import load_dotenv
 
 from corsheaders.defaults import default_headers
+from django.core.exceptions import ImproperlyConfigured
 
 pymysql.version_info = (2, 2, 1, 'final', 0) 
 pymysql.install_as_MySQLdb()
@@ -69,6 +70,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tracker.middleware.CompressionMiddleware', # Outermost so it compresses the final body
     'corsheaders.middleware.CorsMiddleware',
     'clerk.middleware.ClerkMiddleware',
 
@@ -77,6 +79,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tracker.middleware.ProfilingMiddleware', # Only active for X-Profile requests from staff / with PROFILING_TOKEN
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'tracker.middleware.ForceCorsMiddleware', # Ensure CORS headers are set on final response
@@ -124,6 +127,76 @@ if os.getenv('DATABASE_URL'):
         
     DATABASES['default'] = db_config
 
+# Optional read replica for read-heavy API paths (see tracker/db_router.py).
+# Locally two SQLite files work too:
+#   REPLICA_DATABASE_URL=sqlite:///replica.sqlite3 python manage.py migrate --database replica
+if os.getenv('REPLICA_DATABASE_URL'):
+    replica_config = dj_database_url.parse(os.getenv('REPLICA_DATABASE_URL'), conn_max_age=600)
+
+    if 'OPTIONS' in replica_config and 'ssl-mode' in replica_config['OPTIONS']:
+        del replica_config['OPTIONS']['ssl-mode']
+
+    # Tests run against the primary only
+    replica_config['TEST'] = {'MIRROR': 'default'}
+    DATABASES['replica'] = replica_config
+
+DATABASE_ROUTERS = ['tracker.db_router.ReadReplicaRouter']
+
+# After a write, a user's reads stay on the primary for this many seconds
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+# Per-user limits on AI calls: token bucket (capacity, refill per minute) + daily quota
+AI_RATE_LIMITS = {
+    "insights": {"capacity": 5, "refill_per_minute": 2, "daily_quota": 100},
+    "categorize": {"capacity": 30, "refill_per_minute": 10, "daily_quota": 1000},
+}
+
+# Insight prompts: send only the top categories plus an "Others" bucket, rounded amounts
+AI_COMPACT_PROMPTS = os.getenv('AI_COMPACT_PROMPTS', 'false').lower() in ('1', 'true', 'yes')
+AI_COMPACT_TOP_CATEGORIES = int(os.getenv('AI_COMPACT_TOP_CATEGORIES', 5))
+
+# USD per million tokens, for the estimated cost stored with each AI call
+AI_PRICING = {
+    "gemini-2.5-flash": {"input": "0.30", "output": "2.50"},
+}
+
+# Expenses older than this many days are moved to the archive by `archive_expenses`
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 730))
+
+# Per-request profiling (tracker.middleware.ProfilingMiddleware). Without a token only
+# staff sessions can profile.
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+
+# Responses to writes sent with an Idempotency-Key are replayed for this many seconds;
+# `prune_idempotency_keys` deletes older keys
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 60 * 60 * 24))
+
+# /api/sync/: deletes are reported for this many days; older cursors must do a full sync
+SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', 90))
+# Changes newer than this are held back for the next sync, so request writes still in
+# flight when the cursor is issued are not skipped. Bulk jobs, whose transactions can run
+# longer, re-stamp their rows after commit (services.touch_expenses_on_commit).
+SYNC_LAG_SECONDS = int(os.getenv('SYNC_LAG_SECONDS', 2))
+
+# Shared cache so per-user state (replica stickiness, AI rate limits, ...) is seen by every worker.
+# render.yaml provisions one; without REDIS_URL each process uses its own in-memory cache,
+# which is only fine for a single local process.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+elif 'replica' in DATABASES and int(os.getenv('WEB_CONCURRENCY', 1)) > 1:
+    # With several gunicorn workers the read-your-writes marker would only exist in the
+    # worker that took the write, so a follow-up read on another worker could hit a
+    # replica that hasn't caught up. A single local process is fine with its own cache.
+    raise ImproperlyConfigured(
+        "REPLICA_DATABASE_URL with WEB_CONCURRENCY > 1 needs REDIS_URL (a cache shared by all workers)."
+    )
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -185,6 +258,7 @@ CORS_ALLOW_HEADERS = list(default_headers) + [
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "idempotency-key",
 ]
 
 REST_FRAMEWORK = {
@@ -195,4 +269,12 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'tracker.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
+
+# Responses smaller than this (bytes) are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+BROTLI_QUALITY = 5
@@ -18,15 +18,20 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from expense.views import CategoryViewSet, TagViewSet, ExpenseViewSet, UserSettingsViewSet
+from expense.views import CategoryViewSet, TagViewSet, ExpenseViewSet, RecurringExpenseViewSet, BudgetViewSet, CategoryRuleViewSet, SyncViewSet, UserSettingsViewSet
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'tags', TagViewSet, basename='tag')
 router.register(r'expenses', ExpenseViewSet, basename='expense')
+router.register(r'recurring', RecurringExpenseViewSet, basename='recurring')
+router.register(r'budgets', BudgetViewSet, basename='budget')
+router.register(r'rules', CategoryRuleViewSet, basename='rule')
+router.register(r'sync', SyncViewSet, basename='sync')
 router.register(r'settings', UserSettingsViewSet, basename='settings')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/dashboard/', ExpenseViewSet.as_view({'get': 'dashboard'}), name='dashboard'),
     path('api/', include(router.urls)),
 ]